@@ -0,0 +1,53 @@
+import hashlib
+import os
+import sqlite3
+from array import array
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", Path(__file__).parent / ".embeddings.sqlite3"))
+
+
+class EmbeddingCache:
+    """Embeddings already fetched, stored as float32 blobs in a SQLite file"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(str(path))
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{' '.join(text.split())}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str):
+        row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (self.key(model, text),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def put(self, model: str, text: str, vector):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            (self.key(model, text), array("f", vector).tobytes())
+        )
+        self._conn.commit()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def create_embeddings(client, cache: EmbeddingCache, model: str, texts: list) -> list:
+    """Like client.embeddings.create, but only texts missing from the cache are sent"""
+    vectors = [cache.get(model, text) for text in texts]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        response = client.embeddings.create(model=model, input=[texts[i] for i in missing])
+        for i, item in zip(missing, response.data):
+            vectors[i] = item.embedding
+            cache.put(model, texts[i], item.embedding)
+    return vectors
@@ -2,16 +2,24 @@ from dotenv import load_dotenv
 
 from openai import OpenAI
 
+# A small SQLite cache next to this script
+from embedding_cache import EmbeddingCache, create_embeddings
+
 load_dotenv()
 
 client = OpenAI()
+cache = EmbeddingCache()
 
 text = "Dog chases cat"
 
-response = client.embeddings.create(
+# Same as client.embeddings.create, but repeated texts skip the API call
+embedding = create_embeddings(
+    client,
+    cache,
     model="text-embedding-3-small",
-    input=text
-)
+    texts=[text]
+)[0]
 
-print("Vector Embedding:", response.data[0].embedding)
-print("Vector length:", len(response.data[0].embedding))
\ No newline at end of file
+print("Vector Embedding:", embedding)
+print("Vector length:", len(embedding))
+print("Cache:", cache.stats())
\ No newline at end of file
@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 from openai import OpenAI
+import hashlib
 import json
 
 load_dotenv()
@@ -88,9 +89,13 @@ SYSTEM_PROMPT = """
 
 # print("\n\n\n sd", response.choices[0].message.content)
 
+# The system prompt is a fixed prefix and the history is only appended to,
+# so every step after the first can reuse the cached prompt
 messages = [
     {"role": "system", "content": SYSTEM_PROMPT},
 ]
+# Requests with the same key are routed to the same prompt cache
+cache_key = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:32]
 
 query = input("> ")
 messages.append({"role": "user", "content": query})
@@ -100,7 +105,13 @@ while True:
         model="gpt-4.1-mini",
         response_format={"type": "json_object"},
         messages=messages,
+        # Sent as a raw body field, so older openai clients pass it through too
+        extra_body={"prompt_cache_key": cache_key},
     )
+    usage = response.usage
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+    print(f"    💾 Input: {usage.prompt_tokens} tokens, {cached} cached · Output: {usage.completion_tokens} tokens")
 
     messages.append({"role":"assistant", "content": response.choices[0].message.content})
     parsed_response = json.loads(response.choices[0].message.content)
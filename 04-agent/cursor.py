@@ -1,38 +1,37 @@
 from dotenv import load_dotenv
 from openai import OpenAI
-from datetime import datetime
-import json
 import os
-import subprocess
-import threading
-import time
 import signal
 import sys
+from typing import Annotated
+
+from history import HistoryManager
+from runner import COMMAND_TIMEOUT, COMMAND_WAIT, CommandRunner
+from tool_engine import ToolEngine, tool
 
 load_dotenv()
 
 client = OpenAI()
 
+# How long run_server watches a new server's output before returning
+SERVER_STARTUP_WAIT = float(os.getenv("AGENT_SERVER_STARTUP_WAIT", "3"))
+
 class EnhancedAssistant:
     def __init__(self):
-        self.running_processes = []
+        # Commands run off the main thread, streaming their output as they go
+        self.runner = CommandRunner()
+        self.server_jobs = []
         self.project_config = {}
         
-    def run_command(self, cmd: str):
-        """Execute shell command and return output"""
+    @tool(description="Execute shell commands (ls, mkdir, npm install, etc.)")
+    def run_command(self, cmd: Annotated[str, "The shell command"]):
+        """Execute shell command and return output
+
+        Commands still running after COMMAND_WAIT seconds carry on in the
+        background; the result then has status "running" and a job_id.
+        """
         try:
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
-            return {
-                "returncode": result.returncode,
-                "stdout": result.stdout,
-                "stderr": result.stderr
-            }
-        except subprocess.TimeoutExpired:
-            return {
-                "returncode": -1,
-                "stdout": "",
-                "stderr": "Command timed out after 30 seconds"
-            }
+            return self.runner.run(cmd, wait=COMMAND_WAIT, timeout=COMMAND_TIMEOUT)
         except Exception as e:
             return {
                 "returncode": -1,
@@ -40,16 +39,23 @@ class EnhancedAssistant:
                 "stderr": str(e)
             }
     
-    def run_server(self, cmd: str):
+    @tool(description="Check on a command still running in the background, waiting up to `wait` seconds for it to finish")
+    def check_command(
+        self,
+        job_id: Annotated[int, "The job_id returned for the running command"],
+        wait: Annotated[float, "Seconds to wait for it to finish (0 to just check)"] = 0
+    ):
+        """Get the status and latest output of a background command"""
+        return self.runner.check(job_id, wait=min(wait, COMMAND_WAIT))
+    
+    @tool(description="Start development servers in background (npm start, python -m http.server, etc.)")
+    def run_server(self, cmd: Annotated[str, "The command that starts the server"]):
         """Run server command in background"""
         try:
-            process = subprocess.Popen(cmd, shell=True)
-            self.running_processes.append(process)
-            return {
-                "returncode": 0,
-                "stdout": f"Server started with PID: {process.pid}",
-                "stderr": ""
-            }
+            # Servers run until stopped; the first seconds of output show whether it came up
+            result = self.runner.run(cmd, wait=SERVER_STARTUP_WAIT, timeout=0)
+            self.server_jobs.append(result["job_id"])
+            return result
         except Exception as e:
             return {
                 "returncode": -1,
@@ -57,21 +63,25 @@ class EnhancedAssistant:
                 "stderr": str(e)
             }
     
+    @tool(parallel=False)
     def stop_servers(self):
         """Stop all running servers"""
-        for process in self.running_processes:
-            try:
-                process.terminate()
-                process.wait(timeout=5)
-            except:
-                process.kill()
-        self.running_processes.clear()
+        for job_id in self.server_jobs:
+            self.runner.stop(job_id)
+        self.server_jobs.clear()
         return {
             "returncode": 0,
             "stdout": "All servers stopped",
             "stderr": ""
         }
     
+    def shutdown(self):
+        """Stop servers and any commands still running in the background"""
+        self.stop_servers()
+        self.runner.stop_all()
+    
+    # Prompts the user, so it never runs alongside other tools
+    @tool(parallel=False)
     def get_project_preferences(self):
         """Get user preferences for CSS framework and project type"""
         print("\n🎨 Project Setup Preferences:")
@@ -126,16 +136,9 @@ class EnhancedAssistant:
         
         return self.project_config
 
-available_tools = {
-    "run_command": None,  # Will be set later
-    "run_server": None,   # Will be set later
-    "stop_servers": None, # Will be set later
-    "get_project_preferences": None  # Will be set later
-}
-
 SYSTEM_PROMPT = f"""
 You are an advanced AI Assistant specialized in web development and shell commands.
-You work in start, plan, action, observe mode with enhanced capabilities.
+You plan, call tools and observe their results, with enhanced capabilities.
 
 ENHANCED CAPABILITIES:
 - Project setup with CSS framework preferences (Tailwind CSS, Bootstrap, or None)
@@ -152,27 +155,15 @@ WORKFLOW:
 4. Observe results and continue or resolve
 
 RULES:
-- Always follow the Output JSON Format
-- Perform one step at a time and wait for observation
+- Request independent tool calls together (e.g. creating separate files); they run at the same time
+- Commands that depend on each other go in one run_command call, joined with &&
 - For web projects, automatically set up the chosen CSS framework
 - When starting servers, use run_server instead of run_command
+- Long commands (installs, builds) keep running in the background when they outlast the wait; carry on with
+  independent steps and use check_command with the job_id before relying on their result
 - Handle errors gracefully and provide solutions
 - Don't ask for user input during command execution
 
-OUTPUT JSON FORMAT:
-{{
-    "step": "plan|action|observe|output",
-    "content": "Detailed description of what you're doing",
-    "function": "Function name if step is action",
-    "input": "Function input parameter"
-}}
-
-AVAILABLE TOOLS:
-- "run_command": Execute shell commands (ls, mkdir, npm install, etc.)
-- "run_server": Start development servers in background (npm start, python -m http.server, etc.)
-- "stop_servers": Stop all running development servers
-- "get_project_preferences": Get user preferences for CSS framework and project type
-
 PROJECT SETUP EXAMPLES:
 - React + Tailwind: npx create-react-app myapp && cd myapp && npm install -D tailwindcss postcss autoprefixer
 - Vue + Bootstrap: npm create vue@latest myapp && cd myapp && npm install bootstrap
@@ -192,25 +183,50 @@ Remember: Be proactive in setting up complete development environments!
 
 def signal_handler(sig, frame):
     print('\n\n🛑 Shutting down gracefully...')
-    assistant.stop_servers()
+    assistant.shutdown()
     sys.exit(0)
 
+def show_result(name, output):
+    """Show the user a tool's result
+
+    Command output has already been streamed to the terminal.
+    """
+    if isinstance(output, dict):
+        if output.get("status") == "running":
+            print(f"⏳ Still running in the background as job {output['job_id']} ({output['elapsed']}s)")
+        elif output.get("returncode") == 0:
+            if output.get("stdout") and "job_id" not in output:
+                print(f"✅ Success: {output['stdout']}")
+            else:
+                print("✅ Success")
+        else:
+            print(f"❌ Error: {output.get('stderr') or output.get('status', 'Unknown error')}")
+    else:
+        print(f"ℹ️  Result: {output}")
+
 def main():
     global assistant
     assistant = EnhancedAssistant()
     
-    # Set up tool references
-    available_tools["run_command"] = assistant.run_command
-    available_tools["run_server"] = assistant.run_server
-    available_tools["stop_servers"] = assistant.stop_servers
-    available_tools["get_project_preferences"] = assistant.get_project_preferences
+    engine = ToolEngine(
+        client,
+        [
+            assistant.run_command,
+            assistant.check_command,
+            assistant.run_server,
+            assistant.stop_servers,
+            assistant.get_project_preferences,
+        ],
+        model="gpt-4.1",
+        temperature=0.1
+    )
     
     # Handle Ctrl+C gracefully
     signal.signal(signal.SIGINT, signal_handler)
     
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT}
-    ]
+    # The system prompt and tools form a fixed prefix the API can cache; long
+    # sessions stay within a token budget, old turns are summarized
+    messages = HistoryManager(SYSTEM_PROMPT, client=client, tools=engine.definitions)
     
     print("🚀 Enhanced AI Development Assistant")
     print("Type 'exit' to quit, 'stop' to stop all servers")
@@ -221,7 +237,9 @@ def main():
             query = input("\n> ").strip()
             
             if query.lower() in ['exit', 'quit']:
-                assistant.stop_servers()
+                assistant.shutdown()
+                totals = engine.meter.totals()
+                print(f"💾 Session: {totals['cached_tokens']} of {totals['prompt_tokens']} input tokens served from the prompt cache")
                 print("👋 Goodbye!")
                 break
             
@@ -233,96 +251,29 @@ def main():
             if not query:
                 continue
             
+            if messages.compact():
+                print("🗜️  Condensed earlier conversation into a summary")
             messages.append({"role": "user", "content": query})
             
-            step_count = 0
-            max_steps = 20  # Prevent infinite loops
-            
-            while step_count < max_steps:
-                try:
-                    response = client.chat.completions.create(
-                        model="gpt-4.1",
-                        response_format={"type": "json_object"},
-                        messages=messages,
-                        temperature=0.1
-                    )
-                    
-                    assistant_message = response.choices[0].message.content
-                    messages.append({"role": "assistant", "content": assistant_message})
-                    
-                    try:
-                        parsed_response = json.loads(assistant_message)
-                    except json.JSONDecodeError:
-                        print("❌ Error: Invalid JSON response from AI")
-                        break
-                    
-                    step = parsed_response.get("step", "")
-                    content = parsed_response.get("content", "")
-                    
-                    if step == "plan":
-                        print(f"🧠 Planning: {content}")
-                        step_count += 1
-                        continue
-                    
-                    elif step == "action":
-                        function_name = parsed_response.get("function")
-                        function_input = parsed_response.get("input", "")
-                        
-                        print(f"🛠️  Executing: {function_name}")
-                        if content:
-                            print(f"   {content}")
-                        
-                        if function_name in available_tools:
-                            if function_name == "get_project_preferences":
-                                output = available_tools[function_name]()
-                            else:
-                                output = available_tools[function_name](function_input)
-                            
-                            # Format output for AI
-                            observation = {
-                                "step": "observe",
-                                "output": output
-                            }
-                            messages.append({"role": "user", "content": json.dumps(observation)})
-                            
-                            # Show user the result
-                            if isinstance(output, dict):
-                                if output.get("returncode") == 0:
-                                    if output.get("stdout"):
-                                        print(f"✅ Success: {output['stdout']}")
-                                else:
-                                    print(f"❌ Error: {output.get('stderr', 'Unknown error')}")
-                            else:
-                                print(f"ℹ️  Result: {output}")
-                        else:
-                            print(f"❌ Unknown function: {function_name}")
-                            break
-                        
-                        step_count += 1
-                        continue
-                    
-                    elif step == "output":
-                        print(f"🤖 Result: {content}")
-                        break
-                    
-                    elif step == "observe":
-                        # AI is processing observation
-                        step_count += 1
-                        continue
-                    
-                    else:
-                        print(f"❓ Unknown step: {step}")
-                        break
-                
-                except Exception as e:
-                    print(f"❌ Error during execution: {str(e)}")
-                    break
-            
-            if step_count >= max_steps:
-                print("⚠️  Maximum steps reached. Task may be too complex.")
+            try:
+                # Tool calls requested in the same turn run together
+                result = engine.run(
+                    messages,
+                    max_rounds=20,  # Prevent infinite loops
+                    on_message=lambda content: print(f"🧠 Planning: {content}"),
+                    on_call=lambda name, arguments: print(f"🛠️  Executing: {name} {arguments}"),
+                    on_result=show_result,
+                    on_usage=lambda call: print(f"   {engine.meter.describe(call)}")
+                )
+                if result is None:
+                    print("⚠️  Maximum steps reached. Task may be too complex.")
+                else:
+                    print(f"🤖 Result: {result}")
+            except Exception as e:
+                print(f"❌ Error during execution: {str(e)}")
         
         except KeyboardInterrupt:
-            assistant.stop_servers()
+            assistant.shutdown()
             print("\n👋 Goodbye!")
             break
         except Exception as e:
@@ -0,0 +1,191 @@
+import os
+from functools import lru_cache
+
+import tiktoken
+
+from prompt_cache import MessageBuilder
+
+# Most tokens of history resent to the model on each call
+HISTORY_TOKEN_BUDGET = int(os.getenv("AGENT_HISTORY_TOKENS", "16000"))
+
+# Tool outputs longer than this keep only their head and tail
+OBSERVATION_TOKENS = int(os.getenv("AGENT_OBSERVATION_TOKENS", "1500"))
+
+# Compaction shrinks the history to this share of the budget, so it runs
+# once every few turns instead of on every turn once the budget is reached
+COMPACT_TARGET = 0.6
+
+SUMMARY_TOKENS = 800
+
+# Every message costs a few tokens of framing on top of its content
+TOKENS_PER_MESSAGE = 3
+
+SUMMARY_PROMPT = """
+You maintain the running summary of a conversation between a user and an AI assistant that uses tools.
+Merge the earlier summary and the new conversation turns into one updated summary.
+Keep: the user's goals and preferences, decisions made, files and projects created, commands run and
+whether they worked, errors and their fixes, servers started, and anything still pending.
+Drop: tool output details that no longer matter and the assistant's intermediate reasoning.
+Reply with the summary only.
+"""
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def truncate_middle(text: str, max_tokens: int, model: str = "gpt-4.1") -> str:
+    """Keep the head and tail of text within max_tokens, eliding the middle"""
+    encoding = get_encoding(model)
+    tokens = encoding.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    # Commands usually explain themselves at the start and fail at the end
+    head = max_tokens * 2 // 3
+    tail = max_tokens - head
+    omitted = len(tokens) - head - tail
+    return (
+        encoding.decode(tokens[:head])
+        + f"\n[... {omitted} tokens omitted ...]\n"
+        + encoding.decode(tokens[-tail:])
+    )
+
+
+class HistoryManager(MessageBuilder):
+    """Conversation history held to a token budget
+
+    The cached prefix (system prompt, examples, tools) and the most recent
+    turns stay exact. Tool outputs are cut to their head and tail as they
+    are added, and once the history outgrows the budget the oldest turns are
+    folded into a rolling summary placed right after the prefix, so every
+    call costs about the same however long the session runs.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        client=None,
+        model: str = "gpt-4.1",
+        budget: int = HISTORY_TOKEN_BUDGET,
+        observation_tokens: int = OBSERVATION_TOKENS,
+        keep_turns: int = 2,
+        keep_rounds: int = 2,
+        summary_model: str = "gpt-4.1-mini",
+        examples=(),
+        tools=None,
+    ):
+        super().__init__(system_prompt, examples, tools)
+        self.client = client
+        self.model = model
+        self.budget = budget
+        self.observation_tokens = observation_tokens
+        self.keep_turns = keep_turns
+        self.keep_rounds = keep_rounds
+        self.summary_model = summary_model
+        self._prefix_tokens = sum(self.count(message) for message in self.prefix)
+        self.summary = ""
+        self.turns = []  # each a list of (message, tokens), starting with a user message
+
+    def count(self, message: dict) -> int:
+        encoding = get_encoding(self.model)
+        tokens = TOKENS_PER_MESSAGE + len(encoding.encode_ordinary(message.get("content") or ""))
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call["function"]
+            tokens += len(encoding.encode_ordinary(function["name"] + function["arguments"]))
+        return tokens
+
+    def append(self, message: dict):
+        if message["role"] == "tool":
+            message = {**message, "content": truncate_middle(message["content"], self.observation_tokens, self.model)}
+        if message["role"] == "user" or not self.turns:
+            self.turns.append([])
+        self.turns[-1].append((message, self.count(message)))
+
+    def _summary_message(self):
+        return {"role": "system", "content": f"Summary of the conversation so far:\n{self.summary}"}
+
+    @property
+    def messages(self) -> list:
+        """The messages to send: the cached prefix, rolling summary, then the kept turns"""
+        messages = list(self.prefix)
+        if self.summary:
+            messages.append(self._summary_message())
+        messages.extend(message for turn in self.turns for message, _ in turn)
+        return messages
+
+    def tokens(self) -> int:
+        total = self._prefix_tokens + sum(tokens for turn in self.turns for _, tokens in turn)
+        return total + (self.count(self._summary_message()) if self.summary else 0)
+
+    def compact(self) -> bool:
+        """Fold the oldest turns into the summary if the history is over budget
+
+        A single turn that keeps calling tools is condensed too, by folding
+        its oldest tool-calling rounds. Call between turns or once a round's
+        results are all appended, so a tool call is never separated from its
+        result.
+        """
+        if self.tokens() <= self.budget:
+            return False
+        target = self.budget * COMPACT_TARGET
+        folded = []
+        while len(self.turns) > self.keep_turns and self.tokens() > target:
+            folded.extend(self.turns.pop(0))
+        if self.turns and self.tokens() > target:
+            folded.extend(self._fold_rounds(target))
+        if not folded:
+            return False
+        self.summary = self._summarize([message for message, _ in folded])
+        return True
+
+    def _fold_rounds(self, target: float) -> list:
+        """Remove the oldest tool-calling rounds of the latest turn while it is over target
+
+        A round is an assistant message with tool calls and the results that
+        follow it; the turn's user message and its last keep_rounds rounds stay.
+        """
+        turn = self.turns[-1]
+        folded = []
+        while self.tokens() > target:
+            starts = [i for i, (message, _) in enumerate(turn) if message["role"] == "assistant" and message.get("tool_calls")]
+            if len(starts) <= self.keep_rounds:
+                break
+            start = starts[0]
+            end = next((i for i in range(start + 1, len(turn)) if turn[i][0]["role"] != "tool"), len(turn))
+            folded.extend(turn[start:end])
+            del turn[start:end]
+        return folded
+
+    def _summarize(self, messages: list) -> str:
+        transcript = "\n".join(self._render(message) for message in messages)
+        if self.client is not None:
+            try:
+                completion = self.client.chat.completions.create(
+                    model=self.summary_model,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT},
+                        {"role": "user", "content": f"Earlier summary:\n{self.summary or '(none)'}\n\nNew turns:\n{transcript}"},
+                    ],
+                    max_tokens=SUMMARY_TOKENS,
+                    temperature=0
+                )
+                return completion.choices[0].message.content.strip()
+            except Exception as e:
+                print(f"⚠️  History summary failed, keeping an excerpt instead: {str(e)}")
+        # Without a model, keep an excerpt of the transcript
+        return truncate_middle(f"{self.summary}\n{transcript}".strip(), SUMMARY_TOKENS, self.model)
+
+    def _render(self, message: dict) -> str:
+        # Old tool output only matters in outline
+        content = truncate_middle(message.get("content") or "", 200, self.model)
+        calls = [
+            f"{tool_call['function']['name']}({tool_call['function']['arguments']})"
+            for tool_call in message.get("tool_calls") or []
+        ]
+        if calls:
+            content = f"{content} [called {', '.join(calls)}]".strip()
+        return f"{message['role']}: {content}"
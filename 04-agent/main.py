@@ -1,102 +1,89 @@
 from dotenv import load_dotenv
 from openai import OpenAI
-from datetime import datetime
-import json
+from typing import Annotated
 import requests
 import os
+from urllib.parse import quote
+
+from history import HistoryManager
+from runner import COMMAND_WAIT, CommandRunner
+from tool_engine import ToolEngine, tool
 
 load_dotenv()
 
 client = OpenAI()
 
-def run_command(cmd: str):
-    result = os.system(cmd)
-    return result
+# Streams command output to the terminal and keeps its head and tail for the model
+runner = CommandRunner()
+
+@tool
+def run_command(cmd: Annotated[str, "The linux command to execute"]):
+    """Takes linux command as a string, executes it and returns the exit code and output
+
+    Commands still running after AGENT_COMMAND_WAIT seconds carry on in the background and return a job_id.
+    """
+    return runner.run(cmd)
 
-def get_weather(city: str):
-    url = f"https://wttr.in/{city}?format=%C+%t"
-    response = requests.get(url)
+@tool
+def check_command(
+    job_id: Annotated[int, "The job_id of a command still running"],
+    wait: Annotated[float, "Seconds to wait for it to finish"] = 0
+):
+    """Returns the status and latest output of a command running in the background"""
+    return runner.check(job_id, wait=min(wait, COMMAND_WAIT))
 
-    if response.status_code == 200:
-        return f"The weather in {city} is {response.text}."
-    
-    return "Something went wrong"
+# Weather lookups reuse a session's pooled connections; WTTR_URL can point at a local stub
+WTTR_URL = os.getenv("WTTR_URL", "https://wttr.in").rstrip("/")
+HTTP_TIMEOUT = (3.05, 10)  # connect, read
 
+http = requests.Session()
+http.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=8))
+http.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=8))
 
-available_tools = {
-    "get_weather": get_weather,
-    "run_command": run_command
-}
+# The same city asked again within 10 minutes is answered from the cache
+@tool(cache_ttl=600, ignore_case=True)
+def get_weather(city: Annotated[str, "Name of the city"]):
+    """Takes a city name as an input and returns the current weather for the city"""
+    response = http.get(f"{WTTR_URL}/{quote(city)}", params={"format": "%C %t"}, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    return f"The weather in {city} is {response.text}."
+
+
+available_tools = [get_weather, run_command, check_command]
 
 SYSTEM_PROMPT = f"""
     You are an helpfull AI Assistant who is specialized in resolving user query.
-    You work on start, plan, action, observe mode.
-
-    For the given user query and available tools, plan the step by step execution, based on the planning,
-    select the relevant tool from the available tool. and based on the tool selection you perform an action to call the tool.
 
-    Wait for the observation and based on the observation from the tool call resolve the user query.
+    For the given user query, plan the step by step execution and call the relevant tools.
+    Wait for the tool results and based on them resolve the user query.
 
     Rules:
-    - Follow the Output JSON Format.
-    - Always perform one step at a time and wait for next input
     - Carefully analyse the user query
-
-    Output JSON Format:
-    {{
-        "step": "string",
-        "content": "string",
-        "function": "The name of function if the step is action",
-        "input": "The input parameter for the function",
-    }}
-
-    Available Tools:
-    - "get_weather": Takes a city name as an input and returns the current weather for the city
-    - "run_command": Takes linux command as a string and executes the command and returns the output after executing it.
-
-    Example:
-    User Query: What is the weather of new york?
-    Output: {{ "step": "plan", "content": "The user is interseted in weather data of new york" }}
-    Output: {{ "step": "plan", "content": "From the available tools I should call get_weather" }}
-    Output: {{ "step": "action", "function": "get_weather", "input": "new york" }}
-    Output: {{ "step": "observe", "output": "12 Degree Cel" }}
-    Output: {{ "step": "output", "content": "The weather for new york seems to be 12 degrees." }}
-
+    - When several tool calls don't depend on each other (e.g. the weather of several cities),
+      request them all at once; they run at the same time
+    - Commands that depend on each other go in one run_command call, joined with &&
+    - A command that is still running comes back with a job_id; use check_command before relying on its result
 """
 
-messages = [
-  { "role": "system", "content": SYSTEM_PROMPT }
-]
+engine = ToolEngine(client, available_tools, model="gpt-4.1")
 
-while True:
-    query = input("> ")
-    messages.append({ "role": "user", "content": query })
+def main():
+    # The system prompt and tools form a fixed prefix the API can cache; long
+    # sessions stay within a token budget, old turns are summarized
+    messages = HistoryManager(SYSTEM_PROMPT, client=client, tools=engine.definitions)
 
     while True:
-        response = client.chat.completions.create(
-            model="gpt-4.1",
-            response_format={"type": "json_object"},
-            messages=messages
+        query = input("> ")
+        messages.compact()
+        messages.append({ "role": "user", "content": query })
+
+        output = engine.run(
+            messages,
+            on_message=lambda content: print(f"🧠: {content}"),
+            on_call=lambda name, arguments: print(f"🛠️: Calling Tool:{name} with input {arguments}"),
+            on_usage=lambda call: print(engine.meter.describe(call))
         )
+        print(f"🤖: {output}")
 
-        messages.append({ "role": "assistant", "content": response.choices[0].message.content })
-        parsed_response = json.loads(response.choices[0].message.content)
-
-        if parsed_response.get("step") == "plan":
-            print(f"🧠: {parsed_response.get("content")}")
-            continue
-
-        if parsed_response.get("step") == "action":
-            tool_name = parsed_response.get("function")
-            tool_input = parsed_response.get("input")
-
-            print(f"🛠️: Calling Tool:{tool_name} with input {tool_input}")
-
-            if available_tools.get(tool_name) != False:
-                output = available_tools[tool_name](tool_input)
-                messages.append({ "role": "user", "content": json.dumps({ "step": "observe", "output": output }) })
-                continue
-        
-        if parsed_response.get("step") == "output":
-            print(f"🤖: {parsed_response.get("content")}")
-            break
\ No newline at end of file
+if __name__ == "__main__":
+    main()
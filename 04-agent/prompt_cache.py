@@ -0,0 +1,85 @@
+import hashlib
+import json
+
+
+def prefix_key(prefix, tools=None) -> str:
+    """Short fingerprint of a prompt prefix, sent as the prompt_cache_key"""
+    canonical = json.dumps({"messages": list(prefix), "tools": tools or []}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+class MessageBuilder:
+    """Chat messages laid out for provider prompt caching
+
+    The prefix (system prompt, few-shot examples and the tool definitions
+    sent with it) is fixed when the builder is made and the history is
+    append-only, so each request begins with exactly the bytes of the one
+    before it and the provider serves that part from its prompt cache
+    (OpenAI caches prompts from 1024 tokens on, in 128-token steps).
+    """
+
+    def __init__(self, system_prompt: str, examples=(), tools=None):
+        self.prefix = ({"role": "system", "content": system_prompt}, *(dict(example) for example in examples))
+        self.tools = tools
+        # Requests with the same key are routed to the same cache
+        self.cache_key = prefix_key(self.prefix, tools)
+        self.history = []
+
+    def append(self, message: dict):
+        self.history.append(message)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    @property
+    def messages(self) -> list:
+        return [*self.prefix, *self.history]
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self):
+        return len(self.messages)
+
+
+class UsageMeter:
+    """Cached and uncached input tokens per call and per session, from the API's usage field"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, usage) -> dict:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+        call = {
+            "prompt_tokens": usage.prompt_tokens,
+            "cached_tokens": cached,
+            "uncached_tokens": usage.prompt_tokens - cached,
+            "completion_tokens": usage.completion_tokens,
+        }
+        self.calls += 1
+        self.prompt_tokens += call["prompt_tokens"]
+        self.cached_tokens += cached
+        self.completion_tokens += call["completion_tokens"]
+        return call
+
+    @staticmethod
+    def describe(call: dict) -> str:
+        rate = call["cached_tokens"] / call["prompt_tokens"] if call["prompt_tokens"] else 0
+        return (
+            f"💾 Input: {call['prompt_tokens']} tokens, {call['cached_tokens']} cached ({rate:.0%}), "
+            f"{call['uncached_tokens']} uncached · Output: {call['completion_tokens']} tokens"
+        )
+
+    def totals(self) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "uncached_tokens": self.prompt_tokens - self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
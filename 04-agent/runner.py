@@ -0,0 +1,203 @@
+import asyncio
+import itertools
+import os
+import signal
+import threading
+import time
+from collections import deque
+
+# How long a tool waits for a command before leaving it running in the background
+COMMAND_WAIT = float(os.getenv("AGENT_COMMAND_WAIT", "30"))
+
+# Commands still running after this long are killed (0 = never)
+COMMAND_TIMEOUT = float(os.getenv("AGENT_COMMAND_TIMEOUT", "1800"))
+
+# Output lines kept from the start and the end of each stream for the model
+HEAD_LINES = 40
+TAIL_LINES = 120
+MAX_LINE_CHARS = 400
+
+# A line without a newline is cut off once this much of it is buffered
+MAX_LINE_BYTES = 4 * MAX_LINE_CHARS
+
+READ_CHUNK = 64 * 1024
+
+
+class OutputBuffer:
+    """The first and last lines of a stream, with a count of the lines elided between them"""
+
+    def __init__(self, head: int = HEAD_LINES, tail: int = TAIL_LINES):
+        self.head_size = head
+        self.head = []
+        self.tail = deque(maxlen=tail)
+        self.omitted = 0
+
+    def add(self, line: str):
+        if len(line) > MAX_LINE_CHARS:
+            line = line[:MAX_LINE_CHARS] + " [...]"
+        if len(self.head) < self.head_size:
+            self.head.append(line)
+            return
+        if len(self.tail) == self.tail.maxlen:
+            self.omitted += 1
+        self.tail.append(line)
+
+    def text(self) -> str:
+        lines = list(self.head)
+        if self.omitted:
+            lines.append(f"[... {self.omitted} lines omitted ...]")
+        lines.extend(self.tail)
+        return "\n".join(lines)
+
+
+class Job:
+    def __init__(self, job_id: int, cmd: str):
+        self.id = job_id
+        self.cmd = cmd
+        self.started = time.monotonic()
+        self.finished = None
+        self.stdout = OutputBuffer()
+        self.stderr = OutputBuffer()
+        self.process = None
+        self.task = None
+        self.status = "running"
+
+    def snapshot(self) -> dict:
+        end = self.finished or time.monotonic()
+        return {
+            "job_id": self.id,
+            "command": self.cmd,
+            "status": self.status,
+            "returncode": self.process.returncode if self.process and self.status != "running" else None,
+            "elapsed": round(end - self.started, 1),
+            "stdout": self.stdout.text(),
+            "stderr": self.stderr.text(),
+        }
+
+
+class CommandRunner:
+    """Shell commands on a background asyncio loop, with output streamed as it arrives
+
+    Every line is echoed to the terminal and kept in a head/tail buffer, so
+    the model sees the start and the end of a multi-MB log. A command that
+    outlives its tool's wait keeps running as a background job the agent
+    can check on later, instead of being killed or blocking the session.
+    """
+
+    def __init__(self, echo: bool = True):
+        self.echo = echo
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="command-runner", daemon=True).start()
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def run(self, cmd: str, wait: float = COMMAND_WAIT, timeout: float = COMMAND_TIMEOUT) -> dict:
+        """Start a command and wait up to `wait` seconds for it to finish
+
+        timeout (0 = none) bounds how long it may keep running in the background.
+        """
+        job = self._call(self._start(cmd, timeout))
+        return self.check(job.id, wait)
+
+    def check(self, job_id: int, wait: float = 0) -> dict:
+        """State and output of a job, after waiting up to `wait` seconds for it to finish"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {"job_id": job_id, "status": "unknown", "returncode": -1, "stdout": "", "stderr": f"No job {job_id}"}
+        return self._call(self._wait(job, wait))
+
+    def stop(self, job_id: int) -> dict:
+        job = self.jobs.get(job_id)
+        if job is not None and job.status == "running":
+            self._call(self._stop(job))
+        return self.check(job_id)
+
+    def stop_all(self):
+        for job_id in list(self.jobs):
+            self.stop(job_id)
+
+    async def _start(self, cmd: str, timeout: float) -> Job:
+        job = Job(next(self._ids), cmd)
+        self.jobs[job.id] = job
+        # Its own process group, so stopping it also stops the processes it spawned
+        job.process = await asyncio.create_subprocess_shell(
+            cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
+        )
+        job.task = asyncio.ensure_future(self._supervise(job, timeout))
+        return job
+
+    async def _supervise(self, job: Job, timeout: float):
+        readers = asyncio.gather(
+            self._pump(job, job.process.stdout, job.stdout, ""),
+            self._pump(job, job.process.stderr, job.stderr, "!"),
+        )
+        try:
+            await asyncio.wait_for(job.process.wait(), timeout or None)
+        except asyncio.TimeoutError:
+            job.status = "timed out"
+            self._kill(job)
+            await job.process.wait()
+        try:
+            # Background children may keep the pipes open after the shell exits
+            await asyncio.wait_for(readers, 5)
+        except asyncio.TimeoutError:
+            pass
+        if job.status == "running":
+            job.status = "done"
+        job.finished = time.monotonic()
+
+    async def _pump(self, job: Job, stream, buffer: OutputBuffer, marker: str):
+        pending = b""
+        # Set while discarding the rest of an over-long line (minified output, progress bars)
+        overflowing = False
+        while chunk := await stream.read(READ_CHUNK):
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                if overflowing:
+                    overflowing = False
+                    continue
+                self._emit(job, buffer, marker, line)
+            if len(pending) > MAX_LINE_BYTES:
+                if not overflowing:
+                    self._emit(job, buffer, marker, pending[:MAX_LINE_BYTES])
+                overflowing = True
+                pending = b""
+        if pending and not overflowing:
+            self._emit(job, buffer, marker, pending)
+
+    def _emit(self, job: Job, buffer: OutputBuffer, marker: str, raw: bytes):
+        line = raw.decode("utf-8", errors="replace").rstrip("\r")
+        buffer.add(line)
+        if self.echo:
+            print(f"   [{job.id}]{marker} {line}", flush=True)
+
+    async def _wait(self, job: Job, wait: float) -> dict:
+        if wait > 0 and not job.task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(job.task), wait)
+            except asyncio.TimeoutError:
+                pass
+        return job.snapshot()
+
+    async def _stop(self, job: Job):
+        job.status = "stopped"
+        self._kill(job, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(asyncio.shield(job.task), 5)
+        except asyncio.TimeoutError:
+            self._kill(job)
+            await job.task
+
+    @staticmethod
+    def _kill(job: Job, sig=signal.SIGKILL):
+        try:
+            os.killpg(job.process.pid, sig)
+        except ProcessLookupError:
+            pass
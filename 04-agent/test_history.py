@@ -0,0 +1,72 @@
+import json
+from types import SimpleNamespace
+
+import history
+from history import HistoryManager
+from tool_engine import ToolEngine, tool
+
+
+class ByteEncoding:
+    """One token per byte, so the test needs no downloaded tiktoken encoding"""
+
+    def encode_ordinary(self, text):
+        return list(text.encode("utf-8"))
+
+    def decode(self, tokens):
+        return bytes(tokens).decode("utf-8", errors="ignore")
+
+
+class ScriptedClient:
+    """Requests `rounds` rounds of tool calls, then answers; records each request's size"""
+
+    def __init__(self, manager, rounds):
+        self.manager = manager
+        self.rounds = rounds
+        self.request_tokens = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **options):
+        self.request_tokens.append(sum(self.manager.count(message) for message in messages))
+        round_number = len(self.request_tokens)
+        if round_number > self.rounds:
+            message = SimpleNamespace(content="Done", tool_calls=None)
+        else:
+            message = SimpleNamespace(content=None, tool_calls=[
+                SimpleNamespace(
+                    id=f"call_{round_number}",
+                    function=SimpleNamespace(name="build", arguments=json.dumps({"step": round_number}))
+                )
+            ])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@tool
+def build(step: int):
+    """Run a build step"""
+    return f"step {step}\n" + "compiling module\n" * 100
+
+
+def test_long_tool_turn_stays_within_budget(monkeypatch):
+    monkeypatch.setattr(history, "get_encoding", lambda model: ByteEncoding())
+    messages = HistoryManager("You are a build assistant.", budget=6000, observation_tokens=1500)
+    client = ScriptedClient(messages, rounds=12)
+    engine = ToolEngine(client, [build])
+
+    messages.append({"role": "user", "content": "Build the project"})
+    assert engine.run(messages) == "Done"
+
+    # Twelve rounds of ~1.7k tokens would be ~20k tokens without compaction
+    assert len(client.request_tokens) == 13
+    assert max(client.request_tokens) <= messages.budget
+    assert messages.summary
+
+    # The user's request stays, and every remaining tool result follows its call
+    sent = messages.messages
+    assert sent[0]["role"] == "system" and sent[1]["role"] == "system"
+    assert sent[2] == {"role": "user", "content": "Build the project"}
+    called = set()
+    for message in sent:
+        if message["role"] == "assistant":
+            called.update(tool_call["id"] for tool_call in message.get("tool_calls") or [])
+        if message["role"] == "tool":
+            assert message["tool_call_id"] in called
@@ -0,0 +1,119 @@
+import importlib.util
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+import tool_engine
+from tool_engine import ToolEngine
+
+
+class WeatherStub(BaseHTTPRequestHandler):
+    """Stands in for wttr.in: /Missing is a 404, /Slow never answers within the client's read timeout"""
+
+    requests = []
+
+    def do_GET(self):
+        city = self.path.split("?", 1)[0].lstrip("/")
+        WeatherStub.requests.append(city)
+        if city == "Missing":
+            self.send_error(404)
+            return
+        if city == "Slow":
+            # The client has given up by then, so there is no one to answer
+            time.sleep(0.5)
+            return
+        body = b"Sunny +21C"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def agent():
+    """The agent's main.py, with WTTR_URL pointing at a local stub server"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WeatherStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("WTTR_URL", f"http://127.0.0.1:{server.server_port}")
+        patch.setenv("OPENAI_API_KEY", "test")
+        # Loaded under its own name, so it can't clash with another main module
+        spec = importlib.util.spec_from_file_location("agent_main", Path(__file__).with_name("main.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        yield module
+    server.shutdown()
+    module.runner.stop_all()
+
+
+@pytest.fixture
+def engine(agent, monkeypatch):
+    WeatherStub.requests.clear()
+    clock = [1000.0]
+    monkeypatch.setattr(tool_engine.time, "monotonic", lambda: clock[0])
+    engine = ToolEngine(None, agent.available_tools)
+    engine.clock = clock
+    return engine
+
+
+def test_repeat_call_within_ttl_is_served_from_cache(engine):
+    first = engine.call("get_weather", '{"city": "Paris"}')
+    engine.clock[0] += 599
+    second = engine.call("get_weather", '{"city": "Paris"}')
+
+    assert first == second == "The weather in Paris is Sunny +21C."
+    assert WeatherStub.requests == ["Paris"]
+    assert engine.cache.hits == 1
+
+
+def test_expired_entry_is_fetched_again(engine):
+    engine.call("get_weather", '{"city": "Paris"}')
+    engine.clock[0] += 601
+    engine.call("get_weather", '{"city": "Paris"}')
+
+    assert WeatherStub.requests == ["Paris", "Paris"]
+
+
+def test_case_and_whitespace_variants_share_an_entry(engine):
+    engine.call("get_weather", '{"city": "New York"}')
+    engine.call("get_weather", '{"city": "new york"}')
+    engine.call("get_weather", '{"city": "  NEW   York "}')
+
+    assert WeatherStub.requests == ["New%20York"]
+    assert len(engine.cache.entries) == 1
+
+
+def test_errors_are_not_cached(engine):
+    first = engine.call("get_weather", '{"city": "Missing"}')
+    second = engine.call("get_weather", '{"city": "Missing"}')
+
+    assert first.startswith("Error: HTTPError") and second.startswith("Error: HTTPError")
+    assert WeatherStub.requests == ["Missing", "Missing"]
+    assert not engine.cache.entries
+
+
+def test_timeouts_are_not_cached(agent, engine, monkeypatch):
+    monkeypatch.setattr(agent, "HTTP_TIMEOUT", (1, 0.1))
+    first = engine.call("get_weather", '{"city": "Slow"}')
+    second = engine.call("get_weather", '{"city": "Slow"}')
+
+    assert first.startswith("Error: ReadTimeout") and second.startswith("Error: ReadTimeout")
+    assert WeatherStub.requests == ["Slow", "Slow"]
+    assert not engine.cache.entries
+
+
+def test_commands_are_never_cached(engine, tmp_path):
+    log = tmp_path / "runs.log"
+    arguments = f'{{"cmd": "echo run >> {log}"}}'
+    engine.call("run_command", arguments)
+    engine.call("run_command", arguments)
+
+    assert "run_command" not in engine.cache_options
+    assert log.read_text().splitlines() == ["run", "run"]
+    assert not engine.cache.entries
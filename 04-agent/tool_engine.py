@@ -0,0 +1,283 @@
+import inspect
+import json
+import threading
+import time
+import types
+import typing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from prompt_cache import UsageMeter
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+def tool(
+    fn=None,
+    *,
+    name: str = None,
+    description: str = None,
+    parallel: bool = True,
+    cache_ttl: float = 0,
+    ignore_case: bool = False
+):
+    """Mark a function (or method) as a tool for the model
+
+    parallel=False keeps it out of concurrent batches, e.g. for tools that
+    prompt the user or change shared state. cache_ttl > 0 reuses a result
+    for that many seconds when the tool is called again with the same
+    arguments (compared case-insensitively with ignore_case); leave it at 0
+    for tools with side effects.
+    """
+    def decorate(fn):
+        fn.tool_options = {
+            "name": name or fn.__name__,
+            "description": description,
+            "parallel": parallel,
+            "cache_ttl": cache_ttl,
+            "ignore_case": ignore_case,
+        }
+        return fn
+
+    return decorate(fn) if fn is not None else decorate
+
+
+def json_schema(annotation) -> dict:
+    """JSON schema of a type hint: str, int, float, bool, list[...], dict, Optional, Literal, Annotated"""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Annotated:
+        base, *extras = typing.get_args(annotation)
+        schema = json_schema(base)
+        described = [extra for extra in extras if isinstance(extra, str)]
+        return {**schema, "description": described[0]} if described else schema
+    if origin is typing.Literal:
+        values = list(typing.get_args(annotation))
+        return {**json_schema(type(values[0])), "enum": values}
+    if origin in (typing.Union, types.UnionType):
+        options = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return json_schema(options[0]) if len(options) == 1 else {"anyOf": [json_schema(arg) for arg in options]}
+    if origin in (list, tuple, set):
+        args = typing.get_args(annotation)
+        return {"type": "array", "items": json_schema(args[0])} if args else {"type": "array"}
+    if origin is dict:
+        return {"type": "object"}
+    if annotation in JSON_TYPES:
+        return {"type": JSON_TYPES[annotation]}
+    return {"type": "string"}
+
+
+def function_schema(fn) -> dict:
+    """OpenAI tool definition generated from the function's signature, type hints and docstring"""
+    options = getattr(fn, "tool_options", {})
+    hints = typing.get_type_hints(fn, include_extras=True)
+    properties, required = {}, []
+    for parameter in inspect.signature(fn).parameters.values():
+        if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        properties[parameter.name] = json_schema(hints.get(parameter.name, str))
+        if parameter.default is parameter.empty:
+            required.append(parameter.name)
+    description = options.get("description") or inspect.getdoc(fn) or ""
+    return {
+        "type": "function",
+        "function": {
+            "name": options.get("name") or fn.__name__,
+            "description": description.split("\n\n")[0].strip(),
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        },
+    }
+
+
+def normalize_arguments(fn, kwargs: dict, ignore_case: bool = False) -> str:
+    """Canonical form of a call's arguments: defaults filled in, whitespace collapsed, keys sorted"""
+    try:
+        bound = inspect.signature(fn).bind(**kwargs)
+        bound.apply_defaults()
+        kwargs = bound.arguments
+    except TypeError:
+        pass
+
+    def normalize(value):
+        if isinstance(value, str):
+            value = " ".join(value.split())
+            return value.casefold() if ignore_case else value
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        return value
+
+    return json.dumps(normalize(dict(kwargs)), sort_keys=True, default=str)
+
+
+class ToolCache:
+    """Results of idempotent tool calls, each kept for its tool's cache_ttl"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (tool, arguments) -> (expires, output)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, output, ttl: float):
+        with self._lock:
+            self.entries[key] = (time.monotonic() + ttl, output)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+def format_output(output) -> str:
+    return output if isinstance(output, str) else json.dumps(output, default=str)
+
+
+class ToolEngine:
+    """Chat loop on native tool calling
+
+    Every tool call the model makes in one turn is executed before the next
+    request; consecutive parallel-safe calls run at the same time on a
+    thread pool, so independent lookups or commands cost one round trip.
+    """
+
+    def __init__(self, client, tools, model: str = "gpt-4.1", max_workers: int = 8, **options):
+        self.client = client
+        self.model = model
+        self.options = options
+        self.tools = {}
+        self.parallel = {}
+        self.cache_options = {}
+        self.definitions = []
+        for fn in tools:
+            schema = function_schema(fn)
+            name = schema["function"]["name"]
+            self.tools[name] = fn
+            tool_options = getattr(fn, "tool_options", {})
+            self.parallel[name] = tool_options.get("parallel", True)
+            if tool_options.get("cache_ttl"):
+                self.cache_options[name] = (tool_options["cache_ttl"], tool_options.get("ignore_case", False))
+            self.definitions.append(schema)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self.meter = UsageMeter()
+        self.cache = ToolCache()
+
+    def call(self, name: str, arguments: str):
+        """Run one tool call; errors are returned to the model as text instead of raised
+
+        Tools declared with a cache_ttl answer repeated calls from the cache;
+        failed calls are never cached.
+        """
+        fn = self.tools.get(name)
+        if fn is None:
+            return f"Error: unknown tool '{name}'"
+        try:
+            kwargs = json.loads(arguments or "{}")
+        except json.JSONDecodeError as e:
+            return f"Error: arguments are not valid JSON ({e})"
+        key = None
+        if name in self.cache_options:
+            ttl, ignore_case = self.cache_options[name]
+            key = (name, normalize_arguments(fn, kwargs, ignore_case))
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached[1]
+        try:
+            output = fn(**kwargs)
+        except Exception as e:
+            return f"Error: {type(e).__name__}: {e}"
+        if key is not None:
+            self.cache.set(key, output, ttl)
+        return output
+
+    def execute(self, tool_calls, on_call=None, on_result=None) -> list:
+        """Tool messages answering tool_calls, in the order they were made"""
+        batches = []
+        for tool_call in tool_calls:
+            if self.parallel.get(tool_call.function.name, True) and batches and batches[-1][0]:
+                batches[-1][1].append(tool_call)
+            else:
+                batches.append((self.parallel.get(tool_call.function.name, True), [tool_call]))
+
+        def run(tool_call):
+            if on_call:
+                on_call(tool_call.function.name, tool_call.function.arguments)
+            output = self.call(tool_call.function.name, tool_call.function.arguments)
+            if on_result:
+                on_result(tool_call.function.name, output)
+            return output
+
+        outputs = []
+        for parallel, batch in batches:
+            if parallel and len(batch) > 1:
+                outputs.extend(self._pool.map(run, batch))
+            else:
+                outputs.extend(run(tool_call) for tool_call in batch)
+        return [
+            {"role": "tool", "tool_call_id": tool_call.id, "content": format_output(output)}
+            for tool_call, output in zip(tool_calls, outputs)
+        ]
+
+    def run(self, messages: list, max_rounds: int = 20, on_message=None, on_call=None, on_result=None, on_usage=None):
+        """Answer the conversation, calling tools until the model replies with text
+
+        messages (a list, or a MessageBuilder/HistoryManager) is extended in
+        place with the assistant and tool messages; a HistoryManager is
+        compacted after every round of tool results. Returns the final reply,
+        or None if max_rounds ran out. on_usage receives the cached and
+        uncached token counts of every call.
+        """
+        options = dict(self.options)
+        if getattr(messages, "cache_key", None):
+            # A raw body field, so openai clients older than the prompt_cache_key argument send it too
+            options["extra_body"] = {"prompt_cache_key": messages.cache_key, **options.get("extra_body", {})}
+        for _ in range(max_rounds):
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=list(messages),
+                tools=self.definitions,
+                parallel_tool_calls=True,
+                **options
+            )
+            if response.usage is not None:
+                call = self.meter.record(response.usage)
+                if on_usage:
+                    on_usage(call)
+            message = response.choices[0].message
+            if not message.tool_calls:
+                messages.append({"role": "assistant", "content": message.content})
+                return message.content
+            messages.append({
+                "role": "assistant",
+                "content": message.content,
+                "tool_calls": [
+                    {
+                        "id": tool_call.id,
+                        "type": "function",
+                        "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments},
+                    }
+                    for tool_call in message.tool_calls
+                ],
+            })
+            # Any text next to the tool calls is the model's plan
+            if message.content and on_message:
+                on_message(message.content)
+            messages.extend(self.execute(message.tool_calls, on_call, on_result))
+            # Many rounds of command output can outgrow the budget within one turn
+            if hasattr(messages, "compact"):
+                messages.compact()
+        return None
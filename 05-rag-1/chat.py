@@ -2,31 +2,51 @@ from dotenv import load_dotenv
 from langchain_qdrant import QdrantVectorStore
 from langchain_openai import OpenAIEmbeddings
 from openai import OpenAI
+import os
+
+# The rag-project library (pip install -e ../rag-project)
+from rag_project.embedding_cache import CachedEmbeddings
+from rag_project.local_store import LocalVectorStore
+from rag_project.quantization import qdrant_search_params
+from rag_project.qa import format_chunk, format_context
+from rag_project.context import pack_context
 
 load_dotenv()
 
 client = OpenAI()
 
-# Vector Embeddings
-embedding_model = OpenAIEmbeddings(
-    model="text-embedding-3-large"
-)
+# Vector Embeddings (repeated queries are served from the on-disk cache)
+# EMBEDDING_DIMENSIONS must match what indexing.py used
+embedding_model = CachedEmbeddings(OpenAIEmbeddings(
+    model="text-embedding-3-large",
+    dimensions=int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+))
 
-vector_db = QdrantVectorStore.from_existing_collection(
-    url="http://localhost:6333",
-    collection_name="learning_vectors",
-    embedding=embedding_model
-)
+# VECTOR_BACKEND=local searches the in-process store written by indexing.py
+if os.getenv("VECTOR_BACKEND") == "local":
+    vector_db = LocalVectorStore.from_existing_collection(
+        collection_name="learning_vectors",
+        embedding=embedding_model
+    )
+else:
+    vector_db = QdrantVectorStore.from_existing_collection(
+        url="http://localhost:6333",
+        collection_name="learning_vectors",
+        embedding=embedding_model
+    )
 
 # Take User Query
 query = input("> ")
 
 # Vector Similarity Search [query] in DB
+search_params = qdrant_search_params(os.getenv("VECTOR_QUANTIZATION", "none").lower())
 search_results = vector_db.similarity_search(
-    query=query
+    query=query,
+    **({"search_params": search_params} if search_params else {})
 )
 
-context = "\n\n\n".join([f"Page Content: {result.page_content}\nPage Number: {result.metadata['page_label']}\nFile Location: {result.metadata['source']}" for result in search_results])
+# Merge overlapping chunks and keep the context within CONTEXT_TOKEN_BUDGET tokens
+context = format_context(pack_context(search_results, model="gpt-4.1", render=format_chunk))
 
 SYSTEM_PROMPT = f"""
     You are a helpfull AI Assistant who asnweres user query based on the available context
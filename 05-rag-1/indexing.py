@@ -1,13 +1,19 @@
 from dotenv import load_dotenv
 from pathlib import Path
 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient
 
 import os
 
+# The rag-project library (pip install -e ../rag-project)
+from rag_project.embedding_cache import CachedEmbeddings
+from rag_project.ingest import IngestionPipeline, qdrant_upserter
+from rag_project.local_store import LocalVectorStore
+from rag_project.pdf_loader import iter_pdf_pages
+from rag_project.quantization import qdrant_quantization
+from rag_project.splitter import TokenChunker
+
 # Load environment variables
 load_dotenv()
 
@@ -21,28 +27,40 @@ pdf_path = Path(__file__).parent / "nodejs.pdf"
 if not pdf_path.exists():
     raise FileNotFoundError(f"{pdf_path} does not exist.")
 
-# Load PDF
-loader = PyPDFLoader(file_path=str(pdf_path))
-docs = loader.load()
+# Load PDF lazily, one page at a time (PDF_EXTRACT_WORKERS > 1 parses on a process pool)
+docs = iter_pdf_pages(pdf_path, workers=int(os.getenv("PDF_EXTRACT_WORKERS", "1")))
 
-# Split into chunks
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=400
+# Split into chunks on token offsets (exact token counts, small overlap)
+text_splitter = TokenChunker(
+    chunk_tokens=256,
+    overlap_tokens=32
 )
-split_docs = text_splitter.split_documents(documents=docs)
 
-# Embedding model
-embedding_model = OpenAIEmbeddings(
-    model="text-embedding-3-large"
-)
+# Embedding model (cached on disk, so re-indexing skips already embedded chunks)
+# EMBEDDING_DIMENSIONS shortens the 3072-d vectors, e.g. to 1024 or 256
+embedding_model = CachedEmbeddings(OpenAIEmbeddings(
+    model="text-embedding-3-large",
+    dimensions=int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+))
+
+# Store in Qdrant, or in-process with VECTOR_BACKEND=local (no Qdrant container needed)
+if os.getenv("VECTOR_BACKEND") == "local":
+    upsert = LocalVectorStore.from_texts([], embedding_model, collection_name="learning_vectors").add_vectors
+else:
+    # VECTOR_QUANTIZATION=scalar|binary keeps only a compressed copy of the vectors in RAM
+    upsert = qdrant_upserter(
+        QdrantClient(url="http://localhost:6333"),
+        "learning_vectors",
+        quantization_config=qdrant_quantization(os.getenv("VECTOR_QUANTIZATION", "none").lower())
+    )
 
-# Store in Qdrant
-vector_store = QdrantVectorStore.from_documents(
-    documents=split_docs,
-    url="http://localhost:6333",
-    collection_name="learning_vectors",
-    embedding=embedding_model
+# Split, embed in token-budgeted batches and store concurrently
+pipeline = IngestionPipeline(
+    embedding_model,
+    upsert,
+    max_concurrency=int(os.getenv("INGEST_CONCURRENCY", "4"))
 )
+stats = pipeline.run(docs, split=lambda page: text_splitter.split_documents([page]))
 
-print("✅ Indexing of Documents Done...")
+print(f"✅ Indexing of Documents Done... ({stats.chunks} chunks in {stats.elapsed:.1f}s)")
+print(f"🗄️ Embedding cache: {embedding_model.cache.stats()}")
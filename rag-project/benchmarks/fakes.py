@@ -0,0 +1,165 @@
+"""Deterministic local stand-ins for the OpenAI APIs used by the app"""
+import asyncio
+import hashlib
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def fake_vector(text: str, dim: int) -> list:
+    """Same text, same unit vector: seeded from the text's hash"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeEmbeddings(Embeddings):
+    """LangChain embeddings with a fixed per-request latency"""
+
+    def __init__(self, dim: int = 256, latency: float = 0.0, model: str = "fake-embedding"):
+        self.dim = dim
+        self.latency = latency
+        self.model = model
+        self.requests = 0
+
+    def embed_documents(self, texts: list) -> list:
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [fake_vector(text, self.dim) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list) -> list:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [fake_vector(text, self.dim) for text in texts]
+
+    async def aembed_query(self, text: str) -> list:
+        return (await self.aembed_documents([text]))[0]
+
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def _usage(self, messages: list, words: list):
+        prompt_tokens = sum(len(message["content"].split()) for message in messages)
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=len(words),
+            total_tokens=prompt_tokens + len(words),
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0),
+        )
+
+    def _completion(self, usage):
+        message = SimpleNamespace(role="assistant", content=self.owner.answer, tool_calls=None)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")],
+            usage=usage,
+        )
+
+    @staticmethod
+    def _chunk(index: int, word: str):
+        delta = SimpleNamespace(content=word if index == 0 else " " + word)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+    def create(self, model: str, messages: list, stream: bool = False, **kwargs):
+        owner = self.owner
+        words = owner.answer.split()
+        usage = self._usage(messages, words)
+        if owner.latency:
+            time.sleep(owner.latency)
+        if not stream:
+            if owner.token_interval:
+                time.sleep(owner.token_interval * len(words))
+            return self._completion(usage)
+        return self._stream(words, usage)
+
+    def _stream(self, words, usage):
+        for index, word in enumerate(words):
+            if self.owner.token_interval:
+                time.sleep(self.owner.token_interval)
+            yield self._chunk(index, word)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class _AsyncFakeCompletions(_FakeCompletions):
+    async def create(self, model: str, messages: list, stream: bool = False, **kwargs):
+        owner = self.owner
+        words = owner.answer.split()
+        usage = self._usage(messages, words)
+        if owner.latency:
+            await asyncio.sleep(owner.latency)
+        if not stream:
+            if owner.token_interval:
+                await asyncio.sleep(owner.token_interval * len(words))
+            return self._completion(usage)
+        return self._astream(words, usage)
+
+    async def _astream(self, words, usage):
+        for index, word in enumerate(words):
+            if self.owner.token_interval:
+                await asyncio.sleep(self.owner.token_interval)
+            yield self._chunk(index, word)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class _FakeEmbeddingsAPI:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, model: str, input, **kwargs):
+        if self.owner.latency:
+            time.sleep(self.owner.latency)
+        return self._response(input, **kwargs)
+
+    def _response(self, input, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        dim = kwargs.get("dimensions") or self.owner.embedding_dim
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=index, embedding=fake_vector(text, dim))
+            for index, text in enumerate(texts)
+        ])
+
+
+class FakeOpenAI:
+    """Drop-in for openai.OpenAI covering chat.completions and embeddings
+
+    `latency` is the time to first token, `token_interval` the time per
+    streamed token after that.
+    """
+
+    def __init__(
+        self,
+        answer: str = "The answer is on page 12 of the document.",
+        latency: float = 0.0,
+        token_interval: float = 0.0,
+        embedding_dim: int = 256,
+    ):
+        self.answer = answer
+        self.latency = latency
+        self.token_interval = token_interval
+        self.embedding_dim = embedding_dim
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+        self.embeddings = _FakeEmbeddingsAPI(self)
+
+
+class _AsyncFakeEmbeddingsAPI(_FakeEmbeddingsAPI):
+    async def create(self, model: str, input, **kwargs):
+        if self.owner.latency:
+            await asyncio.sleep(self.owner.latency)
+        return self._response(input, **kwargs)
+
+
+class AsyncFakeOpenAI(FakeOpenAI):
+    """Drop-in for openai.AsyncOpenAI, with the same latencies as FakeOpenAI"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=_AsyncFakeCompletions(self))
+        self.embeddings = _AsyncFakeEmbeddingsAPI(self)
@@ -0,0 +1,315 @@
+"""Latency, throughput and memory benchmarks for ingestion and question answering
+
+OpenAI is replaced by deterministic fakes with configurable latency, and the
+vector store is the embedded local store (or in-process / running Qdrant), so
+runs are repeatable and cost nothing.
+
+Usage:
+    python rag-project/benchmarks/harness.py
+    python rag-project/benchmarks/harness.py --sizes 10000 100000 1000000 --skip-pdf
+    python rag-project/benchmarks/harness.py --backend qdrant-memory --json results.json
+
+Each workload runs in its own process, so peak RSS is per workload; within a
+workload it is the peak reached by the end of each stage.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from langchain_core.documents import Document
+
+from rag_project.async_qa import AsyncAnswerPipeline, EventLoopThread
+from rag_project.bm25 import BM25Index
+from fakes import AsyncFakeOpenAI, FakeEmbeddings
+from rag_project.ingest import IngestionPipeline, vector_store_upserter
+from rag_project.local_store import LocalVectorStore
+from rag_project.manifest import chunk_id
+from rag_project.pdf_loader import iter_pdf_pages
+from rag_project.retrieval import hybrid_search
+from rag_project.splitter import TokenChunker
+
+DEFAULT_PDF = Path(__file__).resolve().parent.parent.parent / "05-rag-1" / "nodejs.pdf"
+SYNTHETIC_VOCABULARY = 50_000
+SYNTHETIC_WORDS = 180  # ~256 tokens, the size of a real chunk
+INSERT_BATCH = 10_000
+
+
+def peak_rss_mb() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def summarize(workload: str, stage: str, seconds: float, ops: int, latencies=None) -> dict:
+    row = {
+        "workload": workload,
+        "stage": stage,
+        "ops": ops,
+        "seconds": round(seconds, 4),
+        "throughput": round(ops / seconds, 1) if seconds else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+        row.update(p50_ms=round(p50, 2), p95_ms=round(p95, 2), p99_ms=round(p99, 2))
+    return row
+
+
+def timed_calls(fn, inputs, concurrency: int = 1):
+    """Call fn on every input and return (wall seconds, per-call latencies)"""
+    def timed(item):
+        started = time.perf_counter()
+        fn(item)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, inputs))
+    else:
+        latencies = [timed(item) for item in inputs]
+    return time.perf_counter() - started, latencies
+
+
+def open_store(backend: str, collection_name: str, embeddings, dim: int, directory: str):
+    if backend == "local":
+        return LocalVectorStore(directory, collection_name, embeddings)
+
+    from langchain_qdrant import QdrantVectorStore
+    from qdrant_client import QdrantClient, models
+
+    if backend == "qdrant-memory":
+        client = QdrantClient(location=":memory:")
+    else:
+        client = QdrantClient(
+            url=os.getenv("QDRANT_URL", "http://localhost:6333"),
+            api_key=os.getenv("QDRANT_API_KEY"),
+        )
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    client.create_collection(
+        collection_name,
+        vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE)
+    )
+    return QdrantVectorStore(client=client, collection_name=collection_name, embedding=embeddings)
+
+
+def query_stages(workload, store, bm25_index, embeddings, client, questions, args) -> list:
+    """Dense, keyword, hybrid and full answer latency over the same questions"""
+    rows = []
+    vectors = embeddings.embed_documents(questions)
+    pairs = list(zip(questions, vectors))
+
+    def keyword_search(question):
+        return [document for document, _ in bm25_index.search(question, k=args.candidates)] if bm25_index else []
+
+    # The first query may build an index (HNSW) or warm caches; keep it apart
+    seconds, _ = timed_calls(lambda pair: store.similarity_search_by_vector(pair[1], k=args.candidates), pairs[:1])
+    rows.append(summarize(workload, "first query", seconds, 1))
+
+    seconds, latencies = timed_calls(
+        lambda pair: store.similarity_search_by_vector(pair[1], k=args.candidates), pairs, args.query_concurrency
+    )
+    rows.append(summarize(workload, "vector search", seconds, len(pairs), latencies))
+
+    if bm25_index:
+        seconds, latencies = timed_calls(lambda pair: keyword_search(pair[0]), pairs, args.query_concurrency)
+        rows.append(summarize(workload, "bm25 search", seconds, len(pairs), latencies))
+
+    def hybrid(question, vector):
+        return hybrid_search(
+            lambda: store.similarity_search_by_vector(vector, k=args.candidates),
+            lambda: keyword_search(question),
+            k=args.k
+        )
+
+    seconds, latencies = timed_calls(lambda pair: hybrid(*pair), pairs, args.query_concurrency)
+    rows.append(summarize(workload, "hybrid search", seconds, len(pairs), latencies))
+
+    # Same path as the chat UI: the async pipeline on a background event loop
+    first_token = []
+    loop = EventLoopThread()
+    pipeline = AsyncAnswerPipeline(
+        client, embeddings, expansions=args.expansions, k=args.k, candidates=args.candidates
+    )
+
+    def answer(question):
+        started = time.perf_counter()
+        first = None
+        for _ in loop.iterate(pipeline.astream(question, [(store, bm25_index)], {})):
+            if first is None:
+                first = time.perf_counter() - started
+        first_token.append(first)
+
+    answered = questions[:args.answers]
+    seconds, latencies = timed_calls(answer, answered, args.query_concurrency)
+    rows.append(summarize(workload, "answer (first token)", seconds, len(answered), first_token))
+    rows.append(summarize(workload, "answer (complete)", seconds, len(answered), latencies))
+    return rows
+
+
+def sample_questions(texts, count: int, seed: int = 0) -> list:
+    """Questions built from words of indexed chunks, so keyword search has hits"""
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        words = rng.choice(texts).split()
+        start = rng.randrange(max(1, len(words) - 8))
+        questions.append(" ".join(words[start:start + 8]))
+    return questions
+
+
+def pdf_workload(args) -> list:
+    workload = Path(args.pdf).name
+    rows = []
+    embeddings = FakeEmbeddings(dim=args.dim, latency=args.embed_latency)
+    client = AsyncFakeOpenAI(latency=args.chat_latency, token_interval=args.token_interval)
+    chunker = TokenChunker(chunk_tokens=256, overlap_tokens=32)
+
+    started = time.perf_counter()
+    pages = list(iter_pdf_pages(args.pdf, workers=args.pdf_workers))
+    rows.append(summarize(workload, "load pages", time.perf_counter() - started, len(pages)))
+
+    started = time.perf_counter()
+    chunks = chunker.split_documents(pages)
+    rows.append(summarize(workload, "split", time.perf_counter() - started, len(chunks)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = open_store(args.backend, "benchmark_pdf", embeddings, args.dim, directory)
+        bm25_index = BM25Index("benchmark_pdf", directory=directory)
+        upsert_vectors = vector_store_upserter(store)
+
+        def upsert(ids, documents, vectors):
+            upsert_vectors(ids, documents, vectors)
+            bm25_index.add(ids, documents)
+
+        pipeline = IngestionPipeline(embeddings, upsert, max_concurrency=args.ingest_concurrency)
+        stats = pipeline.run(
+            iter_pdf_pages(args.pdf, workers=args.pdf_workers),
+            split=lambda page: chunker.split_documents([page]),
+            chunk_id=lambda chunk: chunk_id(workload, chunk.metadata.get("page"), chunk.page_content)
+        )
+        rows.append(summarize(workload, "ingest (pipeline)", stats.elapsed, stats.chunks))
+
+        questions = sample_questions([chunk.page_content for chunk in chunks], args.queries)
+        rows.extend(query_stages(workload, store, bm25_index, embeddings, client, questions, args))
+    return rows
+
+
+def synthetic_workload(size: int, args) -> list:
+    workload = f"synthetic-{size}"
+    rows = []
+    rng = np.random.default_rng(size)
+    embeddings = FakeEmbeddings(dim=args.dim, latency=args.embed_latency)
+    client = AsyncFakeOpenAI(latency=args.chat_latency, token_interval=args.token_interval)
+    # Zipf-distributed words give BM25 realistic posting list lengths
+    vocabulary = np.array([f"term{index}" for index in range(SYNTHETIC_VOCABULARY)])
+    sampled_texts = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = open_store(args.backend, "benchmark_synthetic", embeddings, args.dim, directory)
+        upsert = vector_store_upserter(store)
+        bm25_index = BM25Index("benchmark_synthetic", directory=directory) if size <= args.bm25_max else None
+
+        insert_seconds = 0.0
+        keyword_seconds = 0.0
+        for offset in range(0, size, INSERT_BATCH):
+            count = min(INSERT_BATCH, size - offset)
+            words = np.minimum(rng.zipf(1.3, (count, SYNTHETIC_WORDS)), SYNTHETIC_VOCABULARY) - 1
+            documents = [
+                Document(page_content=" ".join(vocabulary[row]), metadata={"page": (offset + index) // 4})
+                for index, row in enumerate(words)
+            ]
+            vectors = rng.standard_normal((count, args.dim), dtype=np.float32)
+            ids = [chunk_id(workload, document.metadata["page"], str(offset + index))
+                   for index, document in enumerate(documents)]
+            sampled_texts.extend(document.page_content for document in documents[:10])
+
+            started = time.perf_counter()
+            upsert(ids, documents, vectors.tolist() if args.backend != "local" else vectors)
+            insert_seconds += time.perf_counter() - started
+            if bm25_index:
+                started = time.perf_counter()
+                bm25_index.add(ids, documents)
+                keyword_seconds += time.perf_counter() - started
+        rows.append(summarize(workload, "vector insert", insert_seconds, size))
+        if bm25_index:
+            rows.append(summarize(workload, "bm25 index", keyword_seconds, size))
+
+        questions = sample_questions(sampled_texts, args.queries, seed=size)
+        rows.extend(query_stages(workload, store, bm25_index, embeddings, client, questions, args))
+    return rows
+
+
+def run_isolated(fn, *args) -> list:
+    """Run a workload in a fresh process so its peak RSS is its own"""
+    context = multiprocessing.get_context("fork" if sys.platform == "linux" else "spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def print_rows(rows):
+    header = (f"{'workload':<22} {'stage':<22} {'ops':>8} {'seconds':>9} {'ops/s':>10} "
+              f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak RSS MB':>12}")
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['workload']:<22} {row['stage']:<22} {row['ops']:>8} {row['seconds']:>9.3f} "
+            f"{row['throughput']:>10.1f} {row.get('p50_ms', '-'):>9} {row.get('p95_ms', '-'):>9} "
+            f"{row.get('p99_ms', '-'):>9} {row['peak_rss_mb']:>12.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and retrieval against local stand-ins")
+    parser.add_argument("--pdf", default=str(DEFAULT_PDF))
+    parser.add_argument("--skip-pdf", action="store_true", help="only run the synthetic corpora")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10_000, 100_000],
+                        help="synthetic corpus sizes in chunks (e.g. 10000 100000 1000000)")
+    parser.add_argument("--backend", choices=["local", "qdrant-memory", "qdrant"], default="local",
+                        help="qdrant-memory is qdrant_client's in-process mode, qdrant uses QDRANT_URL")
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimensions")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--answers", type=int, default=50, help="questions run through the full answer path")
+    parser.add_argument("--query-concurrency", type=int, default=1)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--expansions", type=int, default=0, help="query rephrasings searched per answer")
+    parser.add_argument("--bm25-max", type=int, default=100_000,
+                        help="skip the keyword index for larger synthetic corpora")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embeddings request")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="seconds to first completion token")
+    parser.add_argument("--token-interval", type=float, default=0.005, help="seconds per streamed token")
+    parser.add_argument("--ingest-concurrency", type=int, default=4)
+    parser.add_argument("--pdf-workers", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    # pypdf warns about every font it can't fully decode
+    logging.getLogger("pypdf").setLevel(logging.ERROR)
+
+    rows = []
+    if not args.skip_pdf:
+        rows.extend(run_isolated(pdf_workload, args))
+    for size in args.sizes:
+        rows.extend(run_isolated(synthetic_workload, size, args))
+
+    print_rows(rows)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Recall, latency and memory of reduced dimensions and quantized vectors
+
+Embeds the PDF's chunks once at full size with text-embedding-3-large
+(cached on disk, so reruns are free), then compares every combination of
+Matryoshka-truncated dimensions and float32 / int8 / binary storage, with and
+without full-precision rescoring, against exact full-size search.
+
+Usage:
+    python rag-project/benchmarks/quantization.py [--pdf file.pdf]
+    python rag-project/benchmarks/quantization.py --collection my_manual   # vectors of a local collection
+    python rag-project/benchmarks/quantization.py --fake --scale 100000     # no API key; latency/memory only
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from dotenv import load_dotenv
+
+from rag_project.quantization import (
+    binarize, hamming_scores, int8_bound, int8_scores, quantize_int8, rescore, top_k, truncate_dimensions,
+)
+
+DEFAULT_PDF = Path(__file__).resolve().parent.parent.parent / "05-rag-1" / "nodejs.pdf"
+FULL_MODEL = "text-embedding-3-large"
+
+
+def load_vectors(args) -> np.ndarray:
+    if args.collection:
+        from rag_project.local_store import LocalVectorStore
+        store = LocalVectorStore.from_existing_collection(args.collection)
+        rows = sorted(store._rows.values())
+        return np.asarray(store._matrix()[rows], dtype=np.float32)
+
+    from rag_project.pdf_loader import iter_pdf_pages
+    from rag_project.splitter import TokenChunker
+
+    chunks = TokenChunker(chunk_tokens=256, overlap_tokens=32).split_documents(list(iter_pdf_pages(args.pdf)))
+    texts = [chunk.page_content for chunk in chunks]
+    if args.fake:
+        from fakes import FakeEmbeddings
+        embeddings = FakeEmbeddings(dim=3072)
+    else:
+        from langchain_openai import OpenAIEmbeddings
+        from rag_project.embedding_cache import CachedEmbeddings
+        embeddings = CachedEmbeddings(OpenAIEmbeddings(model=FULL_MODEL))
+    return np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+
+def scale_corpus(vectors: np.ndarray, size: int, seed: int = 0) -> np.ndarray:
+    """Grow the corpus with noisy copies, for latency and memory at a larger size"""
+    if size <= len(vectors):
+        return vectors
+    rng = np.random.default_rng(seed)
+    copies = vectors[rng.integers(0, len(vectors), size - len(vectors))]
+    noisy = copies + rng.normal(0, 0.02, copies.shape).astype(np.float32)
+    return np.concatenate([vectors, noisy / np.linalg.norm(noisy, axis=1, keepdims=True)])
+
+
+def build_search(storage: str, vectors: np.ndarray, k: int, oversampling: float, rescored: bool):
+    """Return (search(query) -> top rows, bytes held in RAM)"""
+    if storage == "float32":
+        return (lambda query: top_k(vectors @ query, k)), vectors.nbytes
+
+    if storage == "int8":
+        bound = int8_bound(vectors[:10_000])
+        compressed = quantize_int8(vectors, bound)
+        approximate = lambda query: int8_scores(compressed, query, bound)
+    else:
+        compressed = binarize(vectors)
+        approximate = lambda query: hamming_scores(compressed, binarize(query))
+
+    if not rescored:
+        return (lambda query: top_k(approximate(query), k)), compressed.nbytes
+
+    def search(query):
+        shortlist = top_k(approximate(query), int(np.ceil(k * oversampling)))
+        return rescore(shortlist, vectors, query, k)[0]
+
+    # The full vectors are read for rescoring only, so they can live on disk
+    return search, compressed.nbytes
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Dimension and quantization trade-offs on our own embeddings")
+    parser.add_argument("--pdf", default=str(DEFAULT_PDF))
+    parser.add_argument("--collection", help="use the vectors of this local collection instead of the PDF")
+    parser.add_argument("--fake", action="store_true", help="deterministic fake embeddings (recall is meaningless)")
+    parser.add_argument("--dims", type=int, nargs="*", default=[3072, 1536, 1024, 512, 256])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--oversampling", type=float, default=3.0)
+    parser.add_argument("--scale", type=int, default=0, help="grow the corpus to this many vectors")
+    args = parser.parse_args()
+    logging.getLogger("pypdf").setLevel(logging.ERROR)
+
+    full = load_vectors(args)
+    full = scale_corpus(truncate_dimensions(full, full.shape[1]), args.scale)
+    rng = np.random.default_rng(0)
+    query_rows = rng.choice(len(full), size=min(args.queries, len(full)), replace=False)
+    print(f"{len(full)} vectors of {full.shape[1]} dimensions, {len(query_rows)} queries, recall@{args.k}\n")
+
+    # Ground truth: exact full-size search, ignoring the query's own chunk
+    truth = []
+    for row in query_rows:
+        scores = full @ full[row]
+        scores[row] = -np.inf
+        truth.append(set(top_k(scores, args.k).tolist()))
+
+    print(f"{'dims':>5} {'storage':<17} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'RAM MB':>9} {'per 1M vectors':>15}")
+    for dims in [dims for dims in args.dims if dims <= full.shape[1]]:
+        vectors = truncate_dimensions(full, dims)
+        for storage, rescored in [("float32", False), ("int8", False), ("int8", True),
+                                  ("binary", False), ("binary", True)]:
+            search, ram_bytes = build_search(storage, vectors, args.k + 1, args.oversampling, rescored)
+            recalls, latencies = [], []
+            for row, expected in zip(query_rows, truth):
+                started = time.perf_counter()
+                found = search(vectors[row])
+                latencies.append(time.perf_counter() - started)
+                found = [int(result) for result in found if result != row][:args.k]
+                recalls.append(len(expected.intersection(found)) / args.k)
+            p50, p95 = np.percentile(np.asarray(latencies) * 1000, [50, 95])
+            label = f"{storage}{' + rescore' if rescored else ''}"
+            print(
+                f"{dims:>5} {label:<17} {np.mean(recalls):>7.3f} {p50:>8.2f} {p95:>8.2f} "
+                f"{ram_bytes / 2**20:>9.1f} {ram_bytes / len(vectors) * 1e6 / 2**30:>12.2f} GB"
+            )
+
+
+if __name__ == "__main__":
+    main()
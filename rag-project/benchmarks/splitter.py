@@ -0,0 +1,57 @@
+"""Compare TokenChunker with RecursiveCharacterTextSplitter on a PDF
+
+Usage: python rag-project/benchmarks/splitter.py [path/to.pdf]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import tiktoken
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from rag_project.pdf_loader import iter_pdf_pages
+from rag_project.splitter import TokenChunker
+
+DEFAULT_PDF = Path(__file__).resolve().parent.parent.parent / "05-rag-1" / "nodejs.pdf"
+
+
+def bench(name, splitter, pages, encoding, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = splitter.split_documents(pages)
+        timings.append(time.perf_counter() - started)
+    # Counting tokens is what embedding costs, but is kept out of the timing
+    embedded_tokens = sum(
+        chunk.metadata.get("token_count") or len(encoding.encode_ordinary(chunk.page_content))
+        for chunk in chunks
+    )
+    best = min(timings)
+    print(
+        f"{name:<34} {len(chunks):>6} chunks  {best * 1000:>8.1f} ms  "
+        f"{sum(len(page.page_content) for page in pages) / best / 1e6:>6.2f} MB/s  "
+        f"{embedded_tokens:>8} tokens embedded"
+    )
+    return embedded_tokens
+
+
+def main():
+    pdf_path = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PDF
+    pages = list(iter_pdf_pages(pdf_path))
+    encoding = tiktoken.get_encoding("cl100k_base")
+    page_tokens = sum(len(encoding.encode_ordinary(page.page_content)) for page in pages)
+    print(f"{pdf_path.name}: {len(pages)} pages, {page_tokens} tokens of source text\n")
+
+    for name, splitter in [
+        ("RecursiveCharacter 1000/200", RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)),
+        ("RecursiveCharacter 1000/400", RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=400)),
+        ("TokenChunker 256/32", TokenChunker(chunk_tokens=256, overlap_tokens=32)),
+    ]:
+        embedded_tokens = bench(name, splitter, pages, encoding)
+        print(f"{'':<34} overlap overhead: {embedded_tokens / page_tokens - 1:.0%}")
+
+
+if __name__ == "__main__":
+    main()
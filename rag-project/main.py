@@ -1,22 +1,47 @@
 import streamlit as st
+import io
 import logging
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
 import os
 import time
 from datetime import datetime, timedelta
-import tempfile
-import tiktoken
 try:
-    from langchain_community.document_loaders import PyPDFLoader
+    from rag_project.pdf_loader import iter_pdf_pages
 except ImportError:
     # Fallback if pypdf is not available
     st.error("PDF processing library not found. Please install pypdf: pip install pypdf")
     st.stop()
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_qdrant import QdrantVectorStore
-from langchain_openai import OpenAIEmbeddings
-from openai import OpenAI
+from openai import AsyncOpenAI
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+from rag_project.answer_cache import SemanticAnswerCache
+from rag_project.async_qa import AsyncAnswerPipeline, EventLoopThread
+from rag_project.bm25 import BM25Index
+from rag_project.embedding_cache import EmbeddingCache, openai_embeddings
+from rag_project.ingest import IngestionPipeline, vector_store_upserter
+from rag_project.jobs import ACTIVE_STATUSES, IngestionJobs
+from rag_project.local_store import LocalVectorStore
+from rag_project.manifest import IndexManifest, chunk_id, document_id, file_digest
+from rag_project import metrics
+from rag_project.quantization import qdrant_quantization, qdrant_search_params
+from rag_project.splitter import TokenChunker
+from rag_project import tokens
+
+# How often a pooled vector-store handle is re-validated against Qdrant
+VECTOR_STORE_HEALTH_INTERVAL = 60
+
+# Seconds between refreshes of a running ingestion job's progress
+JOB_POLL_INTERVAL = 1
+
+# Payload indexes on the chunk metadata used to scope searches
+PAYLOAD_INDEXES = {
+    "doc_id": models.PayloadSchemaType.KEYWORD,
+    "owner": models.PayloadSchemaType.KEYWORD,
+    "page": models.PayloadSchemaType.INTEGER,
+}
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -49,12 +74,34 @@ def get_environment_variables():
         'OPENAI_API_KEY': os.getenv("OPENAI_API_KEY"),
         'COOKIE_SECRET': os.getenv("COOKIE_SECRET", "default-dev-password-change-in-prod"),
         'APP_USERNAME': os.getenv("APP_USERNAME", "admin"),
-        'APP_PASSWORD': os.getenv("APP_PASSWORD", "admin123")
+        'APP_PASSWORD': os.getenv("APP_PASSWORD", "admin123"),
+        'VECTOR_BACKEND': os.getenv("VECTOR_BACKEND", "qdrant").lower(),
+        'EMBEDDING_MODEL': os.getenv("EMBEDDING_MODEL"),
+        'EMBEDDING_DIMENSIONS': int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None,
+        'VECTOR_QUANTIZATION': os.getenv("VECTOR_QUANTIZATION", "none").lower(),
+        'QUANTIZATION_OVERSAMPLING': float(os.getenv("QUANTIZATION_OVERSAMPLING", "2.0")),
+        'COLLECTION_MODE': os.getenv("COLLECTION_MODE", "per_document").lower(),
+        'SHARED_COLLECTION': os.getenv("SHARED_COLLECTION", "documents"),
+        'QDRANT_PREFER_GRPC': os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true",
+        'INGEST_CONCURRENCY': int(os.getenv("INGEST_CONCURRENCY", "4")),
+        'INGEST_BATCH_TOKENS': int(os.getenv("INGEST_BATCH_TOKENS", "100000")),
+        'PDF_EXTRACT_WORKERS': int(os.getenv("PDF_EXTRACT_WORKERS", "1")),
+        'INGEST_WORKERS': int(os.getenv("INGEST_WORKERS", "2")),
+        'ANSWER_CACHE_THRESHOLD': float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+        'ANSWER_CACHE_TTL': float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+        'RETRIEVAL_K': int(os.getenv("RETRIEVAL_K", "3")),
+        'RETRIEVAL_CANDIDATES': int(os.getenv("RETRIEVAL_CANDIDATES", "10")),
+        'CONTEXT_TOKEN_BUDGET': int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000")),
+        'QUERY_EXPANSIONS': int(os.getenv("QUERY_EXPANSIONS", "0")),
+        'METRICS_PORT': int(os.getenv("METRICS_PORT", "0"))
     }
     
-    # Check critical environment variables
+    # Check critical environment variables (the local backend needs no Qdrant)
+    required_vars = ['OPENAI_API_KEY']
+    if env_vars['VECTOR_BACKEND'] != 'local':
+        required_vars = ['QDRANT_URL', 'QDRANT_API_KEY'] + required_vars
     missing_vars = []
-    for var in ['QDRANT_URL', 'QDRANT_API_KEY', 'OPENAI_API_KEY']:
+    for var in required_vars:
         if not env_vars[var]:
             missing_vars.append(var)
     
@@ -87,10 +134,52 @@ except Exception as e:
     st.error(f"Configuration error: {str(e)}")
     st.stop()
 
-# Initialize OpenAI client
+@st.cache_resource(show_spinner=False)
+def get_embedding_cache():
+    """Process-wide embedding cache shared by all sessions"""
+    return EmbeddingCache()
+
+@st.cache_resource(show_spinner=False)
+def get_bm25_index(collection_name: str):
+    """Process-wide BM25 keyword index for a collection"""
+    return BM25Index(collection_name)
+
+@st.cache_resource(show_spinner=False)
+def get_manifest_lock(collection_name: str):
+    """Serializes manifest updates from jobs indexing into the same collection"""
+    return threading.Lock()
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    """Process-wide semantic cache of answers, shared by all sessions"""
+    return SemanticAnswerCache(
+        threshold=env_vars['ANSWER_CACHE_THRESHOLD'],
+        ttl=env_vars['ANSWER_CACHE_TTL']
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_metrics_server():
+    """Start the Prometheus/JSON metrics endpoint once per process, if configured"""
+    if not env_vars['METRICS_PORT']:
+        return None
+    try:
+        return metrics.start_metrics_server(env_vars['METRICS_PORT'])
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started: {str(e)}")
+        return None
+
+get_metrics_server()
+
+# Initialize OpenAI embeddings
 try:
-    client = OpenAI(api_key=env_vars['OPENAI_API_KEY'])
-    embedding_model = OpenAIEmbeddings(openai_api_key=env_vars['OPENAI_API_KEY'])
+    # v3 models can return shortened (Matryoshka) vectors; existing
+    # collections must be re-indexed after changing the model or dimensions
+    embedding_model = openai_embeddings(
+        env_vars['EMBEDDING_MODEL'],
+        env_vars['EMBEDDING_DIMENSIONS'],
+        cache=get_embedding_cache(),
+        openai_api_key=env_vars['OPENAI_API_KEY']
+    )
 except Exception as e:
     st.error(f"❌ Failed to initialize OpenAI client: {str(e)}")
     st.stop()
@@ -119,9 +208,14 @@ def initialize_session_state():
         "pdf_processed": False,
         "processing": False,
         "current_file": None,
+        "job_id": None,
         "show_clear_confirmation": False,
         "show_logout_confirmation": False,
         "collection_name": None,
+        "documents": None,
+        "selected_docs": [],
+        "collections": {},
+        "selected_collections": [],
         "logout_clicked": False,
     }
     
@@ -144,6 +238,9 @@ def check_cookie_authentication():
             logger.warning(f"Cookie read error: {e}")
     return False
 
+def shared_collection() -> bool:
+    return env_vars['COLLECTION_MODE'] == 'shared'
+
 def create_collection_name(filename: str) -> str:
     """Create a safe collection name from filename"""
     base_name = Path(filename).stem
@@ -152,36 +249,125 @@ def create_collection_name(filename: str) -> str:
         safe_name = "pdf_" + safe_name
     return safe_name.lower()[:50]  # Limit length
 
-def get_vector_store(collection_name: str):
-    """Get or create vector store"""
-    try:
-        vector_store = QdrantVectorStore.from_existing_collection(
+@st.cache_resource(show_spinner=False)
+def get_qdrant_client():
+    """Process-wide Qdrant client whose keep-alive connections all sessions share"""
+    return QdrantClient(
+        url=env_vars['QDRANT_URL'],
+        api_key=env_vars['QDRANT_API_KEY'],
+        prefer_grpc=env_vars['QDRANT_PREFER_GRPC'],
+        timeout=30
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_event_loop():
+    """Background event loop running the async question pipeline for all sessions"""
+    return EventLoopThread()
+
+@st.cache_resource(show_spinner=False)
+def get_answer_pipeline():
+    """Process-wide async answering pipeline with pooled OpenAI and Qdrant connections"""
+    async def connect_qdrant():
+        # Async clients belong to the loop that uses them
+        return AsyncQdrantClient(
             url=env_vars['QDRANT_URL'],
             api_key=env_vars['QDRANT_API_KEY'],
-            collection_name=collection_name,
-            embedding=embedding_model
+            prefer_grpc=env_vars['QDRANT_PREFER_GRPC'],
+            timeout=30
         )
-        return vector_store
+    
+    qdrant_client = None
+    if env_vars['VECTOR_BACKEND'] != 'local':
+        qdrant_client = get_event_loop().run(connect_qdrant())
+    return AsyncAnswerPipeline(
+        AsyncOpenAI(api_key=env_vars['OPENAI_API_KEY']),
+        embedding_model,
+        qdrant_client=qdrant_client,
+        answer_cache=get_answer_cache(),
+        expansions=env_vars['QUERY_EXPANSIONS'],
+        k=env_vars['RETRIEVAL_K'],
+        candidates=env_vars['RETRIEVAL_CANDIDATES'],
+        context_token_budget=env_vars['CONTEXT_TOKEN_BUDGET'],
+        search_params=qdrant_search_params(env_vars['VECTOR_QUANTIZATION'], env_vars['QUANTIZATION_OVERSAMPLING'])
+    )
+
+def vector_store_healthy(vector_store) -> bool:
+    """Re-check a cached handle's collection at most once per interval"""
+    if isinstance(vector_store, LocalVectorStore):
+        return True
+    last_check = getattr(vector_store, "_last_health_check", 0.0)
+    if time.monotonic() - last_check < VECTOR_STORE_HEALTH_INTERVAL:
+        return True
+    try:
+        healthy = vector_store.client.collection_exists(vector_store.collection_name)
+    except Exception as e:
+        logger.warning(f"Qdrant health check failed: {str(e)}")
+        healthy = False
+    vector_store._last_health_check = time.monotonic()
+    return healthy
+
+@st.cache_resource(show_spinner=False, validate=vector_store_healthy)
+def open_vector_store(collection_name: str):
+    """Open a pooled vector-store handle, reused across reruns and sessions"""
+    if env_vars['VECTOR_BACKEND'] == 'local':
+        return LocalVectorStore.from_existing_collection(collection_name, embedding_model)
+    vector_store = QdrantVectorStore(
+        client=get_qdrant_client(),
+        collection_name=collection_name,
+        embedding=embedding_model
+    )
+    vector_store._last_health_check = time.monotonic()
+    return vector_store
+
+def get_vector_store(collection_name: str):
+    """Get or create vector store"""
+    try:
+        return open_vector_store(collection_name)
     except Exception as e:
+        local = env_vars['VECTOR_BACKEND'] == 'local'
+        exists = (LocalVectorStore.collection_exists(collection_name) if local
+                  else get_qdrant_client().collection_exists(collection_name))
+        if exists:
+            # The collection is there, so this was a connection problem
+            raise
         logger.info(f"Creating new collection: {collection_name}")
-        vector_store = QdrantVectorStore.from_documents(
-            documents=[],
-            embedding=embedding_model,
-            url=env_vars['QDRANT_URL'],
-            api_key=env_vars['QDRANT_API_KEY'],
-            collection_name=collection_name,
-            force_recreate=True
-        )
-        return vector_store
+        # A fresh collection holds none of the previously recorded chunks
+        IndexManifest(collection_name).reset()
+        get_bm25_index(collection_name).reset()
+        size = len(embedding_model.embed_query("dimension probe"))
+        if local:
+            LocalVectorStore.create_collection(collection_name, size)
+        else:
+            quantization = qdrant_quantization(env_vars['VECTOR_QUANTIZATION'])
+            get_qdrant_client().create_collection(
+                collection_name,
+                # Quantized vectors stay in RAM; the originals only serve rescoring
+                vectors_config=models.VectorParams(
+                    size=size, distance=models.Distance.COSINE, on_disk=quantization is not None
+                ),
+                quantization_config=quantization
+            )
+            # Filtered searches over many documents stay fast with indexed payloads
+            for field, schema in PAYLOAD_INDEXES.items():
+                get_qdrant_client().create_payload_index(
+                    collection_name, field_name=f"metadata.{field}", field_schema=schema
+                )
+        return open_vector_store(collection_name)
+
+def collection_has_points(collection_name: str) -> bool:
+    """Check that a collection exists and holds at least one vector"""
+    if env_vars['VECTOR_BACKEND'] == 'local':
+        return LocalVectorStore.collection_exists(collection_name) and len(open_vector_store(collection_name)) > 0
+    client = get_qdrant_client()
+    return client.collection_exists(collection_name) and client.count(collection_name, exact=False).count > 0
 
 def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
     """Count tokens in text"""
     try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
+        return tokens.count_tokens(text, model)
     except Exception:
-        # Fallback to word count estimation
-        return len(text.split()) * 1.3
+        # Fallback to word count estimation, kept integral for total_tokens
+        return round(len(text.split()) * 1.3)
 
 def verify_user(username: str, password: str) -> bool:
     """Verify user credentials"""
@@ -255,86 +441,298 @@ def show_auth_ui():
                 if env_vars['APP_USERNAME'] == 'admin' and env_vars['APP_PASSWORD'] == 'admin123':
                     st.info("💡 **Demo Credentials:** Username: admin, Password: admin123")
 
-def process_pdf(uploaded_file):
-    """Process uploaded PDF file"""
+def ingest_pdf(data: bytes, filename: str, collection_name: str, progress=None,
+               owner: str = None, doc_id: str = None) -> dict:
+    """Index a PDF into its collection, embedding only chunks not yet indexed
+
+    Runs on a background worker: no Streamlit calls. progress(**fields) is
+    called as pages are parsed and chunks stored.
+    """
     try:
-        collection_name = create_collection_name(uploaded_file.name)
-        st.session_state.collection_name = collection_name
+        started = time.perf_counter()
+        # A shared collection holds the same filename for several owners
+        doc_key = doc_id if shared_collection() else filename
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            pdf_path = tmp_file.name
+        with metrics.span("digest", pipeline="ingest"):
+            digest = file_digest(data)
+        manifest = IndexManifest(collection_name)
         
-        # Load and split PDF
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
+        # The manifest is only as good as the collection it describes: if that
+        # was dropped or recreated, everything recorded for it must be re-indexed
+        if doc_key in manifest.documents and not collection_has_points(collection_name):
+            logger.warning(f"Collection '{collection_name}' is missing or empty, discarding its manifest")
+            with get_manifest_lock(collection_name):
+                IndexManifest(collection_name).reset()
+            manifest = IndexManifest(collection_name)
         
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
+        if manifest.is_current(doc_key, digest):
+            logger.info(f"'{filename}' unchanged, skipping re-indexing")
+            metrics.increment("rag_documents", result="unchanged")
+            return {"unchanged": True}
+        
+        # Pages are parsed lazily from the in-memory upload and flow straight
+        # into the split/embed/upsert stages, so early chunks are searchable
+        # before the last page is parsed
+        # ~256 tokens is roughly the old 1000-character chunk
+        text_splitter = TokenChunker(
+            chunk_tokens=256,
+            overlap_tokens=32
         )
-        chunks = text_splitter.split_documents(documents)
         
-        # Add to vector store
         vector_db = get_vector_store(collection_name)
-        vector_db.add_documents(chunks)
+        bm25_index = get_bm25_index(collection_name)
+        upsert_vectors = vector_store_upserter(vector_db)
         
-        st.session_state.pdf_processed = True
-        st.session_state.processing = False
-        st.success(f"✅ '{uploaded_file.name}' processed successfully!")
+        def upsert(ids, chunks, vectors):
+            # The keyword index is built alongside the vector upsert
+            upsert_vectors(ids, chunks, vectors)
+            bm25_index.add(ids, chunks)
         
-        return True
+        def split(page):
+            # Chunks carry the payload fields searches are filtered on
+            page.metadata.update(doc_id=doc_id, owner=owner)
+            return text_splitter.split_documents([page])
         
+        def report(stats):
+            if progress:
+                progress(
+                    pages=stats.pages,
+                    total_pages=stats.total_pages,
+                    chunks=stats.chunks,
+                    embedded=stats.embedded,
+                    skipped=stats.skipped
+                )
+        
+        pipeline = IngestionPipeline(
+            embedding_model,
+            upsert,
+            max_concurrency=env_vars['INGEST_CONCURRENCY'],
+            max_batch_tokens=env_vars['INGEST_BATCH_TOKENS']
+        )
+        
+        # Content-hash IDs make re-uploads upserts instead of duplicates,
+        # and chunks already in the manifest skip embedding entirely
+        known_ids = manifest.chunk_ids(doc_key)
+        with metrics.span("pipeline", pipeline="ingest"):
+            stats = pipeline.run(
+                iter_pdf_pages(io.BytesIO(data), filename, workers=env_vars['PDF_EXTRACT_WORKERS']),
+                split=split,
+                chunk_id=lambda chunk: chunk_id(
+                    doc_key, chunk.metadata.get("page"), chunk.page_content
+                ),
+                skip=known_ids.__contains__,
+                progress=report
+            )
+        # Pipeline stages overlap, so per-batch timings show which one is the bottleneck
+        for seconds in stats.embed_seconds:
+            metrics.observe("rag_stage_seconds", seconds, stage="embed_batch", pipeline="ingest")
+        for seconds in stats.upsert_seconds:
+            metrics.observe("rag_stage_seconds", seconds, stage="upsert_batch", pipeline="ingest")
+        
+        # Drop the chunks that disappeared from the new version
+        with metrics.span("cleanup", pipeline="ingest"):
+            current_ids = set(stats.ids)
+            stale_ids = list(known_ids - current_ids)
+            if stale_ids:
+                vector_db.delete(ids=stale_ids)
+                bm25_index.remove(stale_ids)
+            bm25_index.save()
+            
+            # Other jobs may have recorded documents in this collection meanwhile
+            with get_manifest_lock(collection_name):
+                manifest = IndexManifest(collection_name)
+                manifest.record(doc_key, digest, current_ids, filename=filename, owner=owner)
+                manifest.save()
+        
+        metrics.increment("rag_documents", result="indexed")
+        metrics.increment("rag_pages", stats.pages)
+        metrics.increment("rag_chunks", stats.embedded, state="embedded")
+        metrics.increment("rag_chunks", stats.skipped, state="unchanged")
+        metrics.increment("rag_chunks", len(stale_ids), state="removed")
+        metrics.increment("rag_embedding_rate_limits", stats.rate_limited)
+        metrics.observe("rag_stage_seconds", time.perf_counter() - started, stage="total", pipeline="ingest")
+        
+        # Cached answers may cite content that just changed, including
+        # answers given from a partial index while this job was running
+        if stats.embedded or stale_ids:
+            get_answer_cache().invalidate(collection_name)
+        logger.info(
+            f"Indexed '{filename}': {stats.embedded} new, "
+            f"{len(stale_ids)} removed, {stats.skipped} unchanged chunks"
+        )
+        return {"removed": len(stale_ids)}
+        
+    except Exception:
+        metrics.increment("rag_stage_errors", stage="total", pipeline="ingest")
+        raise
+
+@st.cache_resource(show_spinner=False)
+def get_ingestion_jobs():
+    """Process-wide ingestion worker pool shared by all sessions"""
+    return IngestionJobs(ingest_pdf, max_workers=env_vars['INGEST_WORKERS'])
+
+def start_ingestion(uploaded_file):
+    """Queue the upload for background indexing and track it in this session"""
+    try:
+        if shared_collection():
+            collection_name = env_vars['SHARED_COLLECTION']
+        else:
+            collection_name = create_collection_name(uploaded_file.name)
+        owner = st.session_state.username
+        doc_id = document_id(owner, uploaded_file.name)
+        st.session_state.collection_name = collection_name
+        st.session_state.current_file = uploaded_file.name
+        st.session_state.pdf_processed = False
+        st.session_state.processing = True
+        st.session_state.job_id = get_ingestion_jobs().submit(
+            uploaded_file.getvalue(),
+            uploaded_file.name,
+            collection_name,
+            key=doc_id if shared_collection() else uploaded_file.name,
+            owner=owner,
+            doc_id=doc_id
+        )
+        if shared_collection():
+            # Searchable, and selected, as soon as its first chunks are indexed
+            user_documents()[doc_id] = uploaded_file.name
+            if doc_id not in st.session_state.selected_docs:
+                st.session_state.selected_docs = st.session_state.selected_docs + [doc_id]
+        else:
+            # Earlier uploads of this session can be searched alongside it
+            st.session_state.collections[collection_name] = uploaded_file.name
+            if collection_name not in st.session_state.selected_collections:
+                st.session_state.selected_collections = st.session_state.selected_collections + [collection_name]
     except Exception as e:
         st.error(f"❌ Error processing PDF: {str(e)}")
         st.session_state.processing = False
-        return False
-    finally:
-        try:
-            os.unlink(pdf_path)
-        except:
-            pass
 
-def get_ai_response(question: str, collection_name: str) -> str:
-    """Get AI response for the question"""
+def current_job():
+    """State of this session's ingestion job, if any"""
+    if not st.session_state.job_id:
+        return None
+    return get_ingestion_jobs().get(st.session_state.job_id)
+
+def user_documents() -> dict:
+    """This user's documents in the shared collection, doc_id -> filename"""
+    if st.session_state.documents is None:
+        entries = IndexManifest(env_vars['SHARED_COLLECTION']).entries(owner=st.session_state.username)
+        st.session_state.documents = {doc_id: entry.get("filename", doc_id) for doc_id, entry in entries.items()}
+        st.session_state.selected_docs = list(st.session_state.documents)
+    return st.session_state.documents
+
+def search_collections() -> list:
+    """Collections a question is answered from: the shared one, or this session's selected documents"""
+    if shared_collection() or not st.session_state.selected_collections:
+        return [st.session_state.collection_name]
+    return list(st.session_state.selected_collections)
+
+def search_conditions():
+    """Metadata conditions scoping retrieval to the documents selected in this session"""
+    if not shared_collection():
+        return None
+    return {"owner": st.session_state.username, "doc_id": list(st.session_state.selected_docs)}
+
+def document_searchable() -> bool:
+    """True once the document is indexed, or partly indexed by a running job"""
+    if st.session_state.pdf_processed:
+        return True
+    if shared_collection() and user_documents():
+        # Earlier uploads are searchable while another one is indexing
+        if st.session_state.collection_name is None:
+            st.session_state.collection_name = env_vars['SHARED_COLLECTION']
+        return True
+    job = current_job()
+    return bool(job and job["status"] in ACTIVE_STATUSES and job["embedded"] + job["skipped"] > 0)
+
+def render_ingestion_status():
+    """Progress of this session's ingestion job; polled while it runs"""
+    job = current_job()
+    if job is None:
+        return
+    if job["status"] == "done":
+        if not st.session_state.pdf_processed:
+            st.session_state.pdf_processed = True
+            st.session_state.processing = False
+            # Rerun the whole app so the chat and this poller see the new state
+            st.rerun()
+        if job.get("unchanged"):
+            st.success(f"✅ '{job['filename']}' is already indexed!")
+        else:
+            st.success(f"✅ '{job['filename']}' processed successfully!")
+        return
+    if job["status"] == "failed":
+        st.session_state.processing = False
+        st.error(f"❌ Error processing PDF: {job['error']}")
+        return
+    
+    if job["status"] == "queued":
+        st.info("⏳ Waiting for a free indexing worker...")
+        return
+    total_pages = job["total_pages"] or 1
+    st.progress(
+        min(job["pages"] / total_pages, 1.0),
+        text=f"📄 {job['pages']}/{job['total_pages']} pages parsed · "
+             f"🧩 {job['embedded'] + job['skipped']}/{job['chunks']} chunks indexed"
+    )
+    if job["embedded"] + job["skipped"] > 0:
+        st.caption("You can already ask about the pages indexed so far.")
+
+def stream_ai_response(question: str, collection_names: list, usage: dict, conditions=None):
+    """Stream the AI response for the question, filling usage as chunks arrive
+
+    All collections in collection_names are searched at once; conditions
+    ({field: value or list of values}) limits retrieval to matching chunks,
+    e.g. some of a user's documents in a shared collection. The pipeline
+    runs on the background event loop, so this thread only renders tokens.
+    """
     try:
-        vector_db = get_vector_store(collection_name)
-        search_results = vector_db.similarity_search(query=question, k=3)
-        
-        context = "\n\n\n".join([
-            f"Page Content: {result.page_content}\nPage Number: {result.metadata.get('page_label', 'N/A')}\nFile Location: {result.metadata.get('source', 'N/A')}" 
-            for result in search_results
-        ])
-
-        system_prompt = f"""
-        You are a PDF content AI assistant. Your job is to answer questions ONLY using information from the provided PDF context.
-
-        RULES:
-        - If the answer is in the PDF context below → Answer with page citation
-        - If the answer is NOT in the PDF context below → Say: "I'm sorry, I don't have information about that in this PDF. Please ask about something else from the document."
-        - Never use outside knowledge
-        - Never guess or infer beyond what's written
-        - Always cite the page number when possible
-
-        PDF Context:
-        {context}
-        """
-
-        chat_completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": question},
-            ],
-            max_tokens=1000,
-            temperature=0.1
-        )
-        
-        return chat_completion.choices[0].message.content
-        
+        targets = [(get_vector_store(name), get_bm25_index(name)) for name in collection_names]
+        yield from get_event_loop().iterate(get_answer_pipeline().astream(question, targets, usage, conditions))
     except Exception as e:
+        metrics.increment("rag_stage_errors", stage="total", pipeline="answer")
         logger.error(f"Error getting AI response: {str(e)}")
-        return "I'm sorry, I encountered an error while processing your request. Please try again."
+        yield "I'm sorry, I encountered an error while processing your request. Please try again."
+
+def stage_timings(snapshot: dict, pipeline: str) -> list:
+    """Rows of per-stage latency percentiles for one pipeline"""
+    return [
+        {
+            "stage": series["labels"]["stage"],
+            "count": series["count"],
+            "p50 ms": round(series.get("p50", 0) * 1000, 1),
+            "p95 ms": round(series.get("p95", 0) * 1000, 1),
+            "p99 ms": round(series.get("p99", 0) * 1000, 1),
+        }
+        for series in snapshot["histograms"]
+        if series["name"] == "rag_stage_seconds" and series["labels"].get("pipeline") == pipeline
+    ]
+
+def render_performance_panel():
+    """Sidebar view of the process-wide stage timings and counters"""
+    snapshot = metrics.registry.snapshot()
+    with st.expander("⏱️ Performance"):
+        for title, pipeline in [("Answers", "answer"), ("Indexing", "ingest")]:
+            rows = stage_timings(snapshot, pipeline)
+            if rows:
+                st.caption(title)
+                st.dataframe(rows, hide_index=True, use_container_width=True)
+        counters = {
+            (series["name"], tuple(series["labels"].values())): series["value"]
+            for series in snapshot["counters"]
+        }
+        hits = counters.get(("rag_answer_cache", ("hit",)), 0)
+        misses = counters.get(("rag_answer_cache", ("miss",)), 0)
+        st.caption(
+            f"Answer cache: {hits} hits / {misses} misses · "
+            f"Chunks embedded: {counters.get(('rag_chunks', ('embedded',)), 0):.0f}"
+        )
+        st.download_button(
+            "📥 Metrics JSON",
+            metrics.registry.to_json(),
+            file_name="rag-metrics.json",
+            mime="application/json",
+            use_container_width=True
+        )
 
 def main_app():
     """Main application interface"""
@@ -373,17 +771,12 @@ def main_app():
             help="Upload a PDF document to start chatting with it"
         )
         
-        # Process uploaded file
+        # Queue the upload for the background workers; reruns while it is
+        # being indexed keep following the same job
         if uploaded_file is not None:
             if (st.session_state.current_file != uploaded_file.name or 
-                not st.session_state.pdf_processed):
-                
-                st.session_state.processing = True
-                st.session_state.pdf_processed = False
-                st.session_state.current_file = uploaded_file.name
-                
-                with st.spinner("📄 Processing PDF..."):
-                    process_pdf(uploaded_file)
+                current_job() is None):
+                start_ingestion(uploaded_file)
         
         # Current document status
         if st.session_state.current_file:
@@ -394,6 +787,41 @@ def main_app():
                 st.success("✅ **Status:** Processed & Ready")
             else:
                 st.warning("⏳ **Status:** Processing...")
+            
+            job = current_job()
+            polling = job is not None and job["status"] in ACTIVE_STATUSES
+            # Only this fragment reruns while polling, not the whole page
+            st.fragment(run_every=JOB_POLL_INTERVAL if polling else None)(render_ingestion_status)()
+            if job is not None and job["status"] == "failed" and uploaded_file is not None:
+                if st.button("🔄 Retry", use_container_width=True):
+                    start_ingestion(uploaded_file)
+                    st.rerun()
+        
+        # In a shared collection, questions can span any of the user's documents
+        if shared_collection() and user_documents():
+            st.markdown("---")
+            st.markdown("### 📚 Your Documents")
+            documents = user_documents()
+            st.multiselect(
+                "Search in",
+                options=list(documents),
+                format_func=documents.get,
+                key="selected_docs",
+                help="Questions are answered from the selected documents only"
+            )
+        elif len(st.session_state.collections) > 1:
+            st.markdown("---")
+            st.markdown("### 📚 Your Documents")
+            st.multiselect(
+                "Search in",
+                options=list(st.session_state.collections),
+                format_func=st.session_state.collections.get,
+                key="selected_collections",
+                help="Questions are answered from all selected documents at once"
+            )
+        
+        st.markdown("---")
+        render_performance_panel()
 
     # Main content
     st.markdown("""
@@ -419,9 +847,15 @@ def main_app():
 
     # Chat input
     if prompt := st.chat_input("💭 Ask a question about your PDF document..."):
-        if not st.session_state.pdf_processed:
+        if not document_searchable():
             st.warning("⚠️ Please upload and process a PDF document first!")
             st.stop()
+        if shared_collection() and not st.session_state.selected_docs:
+            st.warning("⚠️ Please select at least one document to search!")
+            st.stop()
+        if st.session_state.collections and not st.session_state.selected_collections:
+            st.warning("⚠️ Please select at least one document to search!")
+            st.stop()
         
         # Add user message
         current_time = datetime.now()
@@ -442,38 +876,41 @@ def main_app():
     # Generate AI response
     if (st.session_state.messages and 
         st.session_state.messages[-1]["role"] == "user" and 
-        st.session_state.pdf_processed and 
+        document_searchable() and 
         st.session_state.collection_name):
         
         last_user_message = st.session_state.messages[-1]["content"]
         
         with st.chat_message("assistant"):
-            with st.spinner("🔍 Searching for relevant information..."):
-                response = get_ai_response(last_user_message, st.session_state.collection_name)
-                
-                st.markdown(response)
-                
-                # Add timestamp
-                if "time_obj" in st.session_state.messages[-1]:
-                    user_time = st.session_state.messages[-1]["time_obj"]
-                    response_time = max(datetime.now(), user_time + timedelta(seconds=1))
-                else:
-                    response_time = datetime.now()
-                    
-                response_timestamp = response_time.strftime("%H:%M:%S")
-                st.caption(f"🕒 {response_timestamp}")
-                
-                # Track tokens
-                assistant_tokens = count_tokens(response)
-                st.session_state.total_tokens += assistant_tokens
+            # Render tokens as they arrive instead of waiting for the full answer
+            usage = {}
+            response = st.write_stream(
+                stream_ai_response(
+                    last_user_message, search_collections(), usage, search_conditions()
+                )
+            )
+            
+            # Add timestamp
+            if "time_obj" in st.session_state.messages[-1]:
+                user_time = st.session_state.messages[-1]["time_obj"]
+                response_time = max(datetime.now(), user_time + timedelta(seconds=1))
+            else:
+                response_time = datetime.now()
                 
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response,
-                    "timestamp": response_timestamp,
-                    "tokens": assistant_tokens,
-                    "time_obj": response_time  
-                })
+            response_timestamp = response_time.strftime("%H:%M:%S")
+            st.caption(f"🕒 {response_timestamp}")
+            
+            # Track tokens counted from the stream
+            assistant_tokens = usage.get("completion_tokens", usage.get("streamed_tokens", 0))
+            st.session_state.total_tokens += assistant_tokens
+            
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": response,
+                "timestamp": response_timestamp,
+                "tokens": assistant_tokens,
+                "time_obj": response_time  
+            })
     
     # Clear chat button
     if st.session_state.messages:
@@ -488,7 +925,7 @@ def main_app():
 
     # Statistics
     st.markdown("---")
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.metric("📅 Session Started", st.session_state.last_reset.strftime('%H:%M:%S'))
@@ -498,6 +935,17 @@ def main_app():
     
     with col3:
         st.metric("💬 Messages", len(st.session_state.messages))
+    
+    with col4:
+        answer_timings = {row["stage"]: row for row in stage_timings(metrics.registry.snapshot(), "answer")}
+        total = answer_timings.get("total")
+        st.metric("⏱️ Answer p95", f"{total['p95 ms'] / 1000:.2f}s" if total else "–")
+    
+    cache_stats = get_embedding_cache().stats()
+    st.caption(
+        f"🗄️ Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']:.0%} hit rate, {cache_stats['entries']} stored)"
+    )
 
 def main():
     """Main application entry point"""
@@ -0,0 +1 @@
+"""Ingestion, retrieval and answering shared by the PDF chat app and the tutorial scripts"""
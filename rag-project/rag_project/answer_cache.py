@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Reuse answers to questions whose embeddings are nearly identical
+
+    Entries are kept per collection and search scope (e.g. the documents a
+    question was asked over) with a TTL and LRU eviction; a lookup is a
+    single matrix-vector product against that scope's questions.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 500):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._collections = {}
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, collection_name: str, vector, scope: str = ""):
+        """Return the cached answer for a similar enough question, or None"""
+        query = self._unit(vector)
+        key = (collection_name, scope)
+        with self._lock:
+            entries = self._collections.get(key)
+            if entries:
+                self._expire(key)
+            if not entries:
+                self.misses += 1
+                return None
+            keys, matrix = self._matrix(key)
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entries.move_to_end(keys[best])
+            self.hits += 1
+            return entries[keys[best]]["answer"]
+
+    def store(self, collection_name: str, vector, question: str, answer: str, scope: str = ""):
+        key = (collection_name, scope)
+        with self._lock:
+            entries = self._collections.setdefault(key, OrderedDict())
+            entries[question] = {"vector": self._unit(vector), "answer": answer, "created": time.time()}
+            entries.move_to_end(question)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._matrices.pop(key, None)
+
+    def invalidate(self, collection_name: str):
+        """Drop every answer for a collection, in every scope, e.g. after it was re-ingested
+
+        Answers over several collections are stored under their comma-joined names.
+        """
+        with self._lock:
+            for key in [key for key in self._collections if collection_name in key[0].split(",")]:
+                self._collections.pop(key, None)
+                self._matrices.pop(key, None)
+
+    def _expire(self, key):
+        entries = self._collections[key]
+        cutoff = time.time() - self.ttl
+        expired = [question for question, entry in entries.items() if entry["created"] < cutoff]
+        for question in expired:
+            del entries[question]
+        if expired:
+            self._matrices.pop(key, None)
+
+    def _matrix(self, key):
+        """Stacked unit vectors for a scope, rebuilt only after changes"""
+        if key not in self._matrices:
+            entries = self._collections[key]
+            self._matrices[key] = (
+                list(entries.keys()),
+                np.stack([entry["vector"] for entry in entries.values()]),
+            )
+        return self._matrices[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": sum(len(entries) for entries in self._collections.values()),
+            }
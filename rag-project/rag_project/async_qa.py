@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from langchain_core.documents import Document
+
+from . import metrics
+from .context import CONTEXT_TOKEN_BUDGET
+from .local_store import LocalVectorStore
+from .qa import CHAT_MODEL, build_messages
+from .retrieval import qdrant_filter, reciprocal_rank_fusion
+from .tokens import count_message_tokens, count_tokens
+
+logger = logging.getLogger(__name__)
+
+EXPANSION_PROMPT = (
+    "Rewrite the user's question as {count} different search queries for finding the answer in a PDF. "
+    "Use other wording and the keywords the document is likely to contain. "
+    "Reply with one query per line and nothing else."
+)
+
+
+class EventLoopThread:
+    """An asyncio event loop on a daemon thread, so sync code like a Streamlit script can await coroutines"""
+
+    def __init__(self, name: str = "async-qa"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coroutine, timeout: float = None):
+        """Run a coroutine on the loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def iterate(self, async_iterator):
+        """Consume an async iterator from sync code, one item at a time"""
+        done = object()
+
+        async def next_item():
+            try:
+                return await async_iterator.__anext__()
+            except StopAsyncIteration:
+                return done
+
+        try:
+            while (item := self.run(next_item())) is not done:
+                yield item
+        finally:
+            # A consumer stopping early (e.g. a rerun) still closes the generator on the loop
+            if hasattr(async_iterator, "aclose"):
+                self.run(async_iterator.aclose())
+
+
+async def expand_query(client, question: str, count: int, model: str = CHAT_MODEL) -> list:
+    """The question followed by up to count rephrasings of it, for multi-query retrieval"""
+    if count <= 0:
+        return [question]
+    try:
+        completion = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": EXPANSION_PROMPT.format(count=count)},
+                {"role": "user", "content": question},
+            ],
+            max_tokens=60 * count,
+            temperature=0.3
+        )
+    except Exception as e:
+        # Retrieval still works with the question alone
+        logger.warning(f"Query expansion failed: {str(e)}")
+        return [question]
+    variants = [line.strip(" -*•\t\"") for line in (completion.choices[0].message.content or "").splitlines()]
+    variants = [variant.split(". ", 1)[-1] if variant[:1].isdigit() else variant for variant in variants]
+    return list(dict.fromkeys([question] + [variant for variant in variants if variant][:count]))
+
+
+def point_document(point, vector_store) -> Document:
+    """Document from a Qdrant point, laid out as the vector store writes its payload"""
+    payload = point.payload or {}
+    metadata = dict(payload.get(vector_store.metadata_payload_key) or {})
+    # The same bookkeeping keys the vector store adds, which fusion deduplicates on
+    metadata["_id"] = point.id
+    metadata["_collection_name"] = vector_store.collection_name
+    return Document(page_content=payload.get(vector_store.content_payload_key) or "", metadata=metadata)
+
+
+async def vector_search(vector_store, vector, k: int, conditions=None, qdrant_client=None, search_params=None) -> list:
+    """Dense search of one collection without blocking the event loop"""
+    if isinstance(vector_store, LocalVectorStore):
+        return await asyncio.to_thread(vector_store.similarity_search_by_vector, vector, k=k, filter=conditions)
+    query_filter = qdrant_filter(conditions, vector_store.metadata_payload_key)
+    if qdrant_client is None:
+        return await asyncio.to_thread(
+            vector_store.similarity_search_by_vector, vector, k=k, filter=query_filter, search_params=search_params
+        )
+    response = await qdrant_client.query_points(
+        vector_store.collection_name,
+        query=vector,
+        limit=k,
+        query_filter=query_filter,
+        search_params=search_params,
+        with_payload=True
+    )
+    return [point_document(point, vector_store) for point in response.points]
+
+
+async def keyword_search(bm25_index, query: str, k: int, conditions=None) -> list:
+    results = await asyncio.to_thread(bm25_index.search, query, k=k, filter=conditions)
+    return [document for document, _ in results]
+
+
+async def multi_search(targets, queries, vectors, k: int, conditions=None, qdrant_client=None, search_params=None) -> list:
+    """Every query against the vector and BM25 indexes of every collection at once
+
+    targets are (vector_store, bm25_index or None) pairs; returns one ranked list
+    per search, ready for reciprocal-rank fusion.
+    """
+    searches = []
+    for vector_store, bm25_index in targets:
+        for query, vector in zip(queries, vectors):
+            searches.append(vector_search(vector_store, vector, k, conditions, qdrant_client, search_params))
+            if bm25_index is not None:
+                searches.append(keyword_search(bm25_index, query, k, conditions))
+    return list(await asyncio.gather(*searches))
+
+
+class AsyncAnswerPipeline:
+    """Question answering on asyncio: query expansion, concurrent retrieval
+    across collections and retrievers, and a streamed completion
+
+    Each step waits for its slowest call rather than the sum of them, so
+    adding collections or query variants adds little latency.
+    """
+
+    def __init__(
+        self,
+        client,
+        embeddings,
+        qdrant_client=None,
+        answer_cache=None,
+        model: str = CHAT_MODEL,
+        expansions: int = 0,
+        k: int = 3,
+        candidates: int = 10,
+        context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+        search_params=None,
+    ):
+        self.client = client
+        self.embeddings = embeddings
+        self.qdrant_client = qdrant_client
+        self.answer_cache = answer_cache
+        self.model = model
+        self.expansions = expansions
+        self.k = k
+        self.candidates = candidates
+        self.context_token_budget = context_token_budget
+        self.search_params = search_params
+
+    async def retrieve(self, question: str, question_vector, targets, conditions=None, expansion=None) -> list:
+        """Search with the question right away and with its rephrasings once they arrive"""
+        search = lambda queries, vectors: multi_search(
+            targets, queries, vectors, self.candidates, conditions, self.qdrant_client, self.search_params
+        )
+        original = asyncio.create_task(search([question], [question_vector]))
+        variants = (await expansion)[1:] if expansion is not None else []
+        variant_results = await search(variants, await self.embeddings.aembed_documents(variants)) if variants else []
+        return reciprocal_rank_fusion(await original + variant_results, k=self.k)
+
+    async def astream(self, question: str, targets, usage: dict, conditions=None):
+        """Yield the answer as it streams, filling usage as chunks arrive
+
+        targets are (vector_store, bm25_index) pairs of the collections to search.
+        """
+        started = time.perf_counter()
+        # Answers are only reused for questions asked over the same documents
+        cache_key = ",".join(sorted(vector_store.collection_name for vector_store, _ in targets))
+        scope = json.dumps(conditions, sort_keys=True) if conditions else ""
+
+        # The rephrasings are generated while the question is embedded and searched
+        expansion = (
+            asyncio.create_task(expand_query(self.client, question, self.expansions, self.model))
+            if self.expansions else None
+        )
+        try:
+            with metrics.span("embed_question", pipeline="answer"):
+                question_vector = await self.embeddings.aembed_query(question)
+            if self.answer_cache is not None:
+                with metrics.span("cache_lookup", pipeline="answer"):
+                    cached_answer = self.answer_cache.lookup(cache_key, question_vector, scope=scope)
+                if cached_answer is not None:
+                    logger.info("Answer served from semantic cache")
+                    metrics.increment("rag_answer_cache", result="hit")
+                    # Nothing is billed for a cached answer; the tokens it saved are counted apart
+                    metrics.increment("rag_tokens", count_tokens(cached_answer), kind="cached")
+                    yield cached_answer
+                    metrics.observe("rag_stage_seconds", time.perf_counter() - started, stage="total", pipeline="answer")
+                    return
+                metrics.increment("rag_answer_cache", result="miss")
+
+            with metrics.span("retrieve", pipeline="answer"):
+                search_results = await self.retrieve(question, question_vector, targets, conditions, expansion)
+            metrics.observe("rag_retrieved_chunks", len(search_results))
+        finally:
+            if expansion is not None and not expansion.done():
+                expansion.cancel()
+
+        with metrics.span("build_prompt", pipeline="answer"):
+            messages = build_messages(question, search_results, token_budget=self.context_token_budget, model=self.model)
+
+        completion_started = time.perf_counter()
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=1000,
+            temperature=0.1,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        parts = []
+        try:
+            async for chunk in stream:
+                # The final chunk carries the exact billed usage
+                if chunk.usage:
+                    usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                    usage["completion_tokens"] = chunk.usage.completion_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not parts:
+                        metrics.observe(
+                            "rag_stage_seconds", time.perf_counter() - completion_started,
+                            stage="first_token", pipeline="answer"
+                        )
+                    parts.append(chunk.choices[0].delta.content)
+                    # Each content delta is one token, until usage says otherwise
+                    usage["streamed_tokens"] = usage.get("streamed_tokens", 0) + 1
+                    yield parts[-1]
+        finally:
+            # No usage chunk, because the server omitted it or the reader stopped
+            # early (GeneratorExit at a yield): count the prompt as it is billed
+            if "prompt_tokens" not in usage:
+                usage["prompt_tokens"] = count_message_tokens(messages, self.model)
+            metrics.increment("rag_tokens", usage["prompt_tokens"], kind="prompt")
+            metrics.increment("rag_tokens", usage.get("completion_tokens", usage.get("streamed_tokens", 0)), kind="completion")
+        # Includes the time the UI took to render the streamed tokens
+        metrics.observe("rag_stage_seconds", time.perf_counter() - completion_started, stage="completion", pipeline="answer")
+
+        if self.answer_cache is not None:
+            self.answer_cache.store(cache_key, question_vector, question, "".join(parts), scope=scope)
+        metrics.observe("rag_stage_seconds", time.perf_counter() - started, stage="total", pipeline="answer")
@@ -0,0 +1,155 @@
+"""Answer a JSONL file of questions against a collection, without the UI
+
+Usage:
+    python -m rag_project.batch_qa questions.jsonl answers.jsonl --collection my_manual
+
+Each input line is {"id": ..., "question": ...}; each output line adds the
+answer, page citations and token usage, written as soon as it is ready.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from .bm25 import BM25Index
+from .embedding_cache import openai_embeddings
+from .local_store import LocalVectorStore
+from .context import CONTEXT_TOKEN_BUDGET
+from .qa import CHAT_MODEL, build_messages, citations
+from .quantization import qdrant_search_params
+from .retrieval import reciprocal_rank_fusion
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def read_questions(path: str) -> list:
+    questions = []
+    with open(path) as questions_file:
+        for line_number, line in enumerate(questions_file, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            entry.setdefault("id", line_number)
+            questions.append(entry)
+    return questions
+
+
+def open_vector_store(collection_name: str, embedding_model):
+    if os.getenv("VECTOR_BACKEND", "qdrant").lower() == "local":
+        return LocalVectorStore.from_existing_collection(collection_name, embedding_model)
+
+    from langchain_qdrant import QdrantVectorStore
+    return QdrantVectorStore.from_existing_collection(
+        url=os.getenv("QDRANT_URL", "http://localhost:6333"),
+        api_key=os.getenv("QDRANT_API_KEY"),
+        collection_name=collection_name,
+        embedding=embedding_model
+    )
+
+
+async def answer_all(args):
+    questions = read_questions(args.questions)
+    logger.info(f"Answering {len(questions)} questions against '{args.collection}'")
+    started = time.perf_counter()
+
+    # Same model, dimensions and search parameters the app indexed and searches with
+    embedding_model = openai_embeddings(args.embedding_model, args.embedding_dimensions)
+    vector_db = open_vector_store(args.collection, embedding_model)
+    search_params = qdrant_search_params(args.quantization, args.oversampling)
+    bm25_index = BM25Index(args.collection)
+    client = AsyncOpenAI(max_retries=5)
+
+    # One batched embeddings call for every question
+    vectors = embedding_model.embed_documents([entry["question"] for entry in questions])
+
+    # Searches are blocking client calls, so fan them out over threads
+    loop = asyncio.get_running_loop()
+    search_pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="batch-search")
+
+    def search(entry, vector):
+        return reciprocal_rank_fusion([
+            vector_db.similarity_search_by_vector(vector, k=args.candidates, search_params=search_params),
+            [document for document, _ in bm25_index.search(entry["question"], k=args.candidates)],
+        ], k=args.k)
+
+    search_tasks = [
+        loop.run_in_executor(search_pool, search, entry, vector)
+        for entry, vector in zip(questions, vectors)
+    ]
+
+    # Bounded worker pool for completions; results are written as they finish
+    queue = asyncio.Queue()
+    for entry, search_task in zip(questions, search_tasks):
+        queue.put_nowait((entry, search_task))
+
+    answered = 0
+    with open(args.output, "w") as output_file:
+        async def worker():
+            nonlocal answered
+            while not queue.empty():
+                entry, search_task = queue.get_nowait()
+                record = {"id": entry["id"], "question": entry["question"]}
+                try:
+                    search_results = await search_task
+                    completion = await client.chat.completions.create(
+                        model=args.model,
+                        messages=build_messages(
+                            entry["question"], search_results, token_budget=args.context_tokens, model=args.model
+                        ),
+                        max_tokens=1000,
+                        temperature=0.1
+                    )
+                    record.update({
+                        "answer": completion.choices[0].message.content,
+                        "citations": citations(search_results),
+                        "usage": {
+                            "prompt_tokens": completion.usage.prompt_tokens,
+                            "completion_tokens": completion.usage.completion_tokens,
+                        },
+                    })
+                except Exception as e:
+                    logger.error(f"Question {entry['id']} failed: {str(e)}")
+                    record["error"] = str(e)
+                output_file.write(json.dumps(record) + "\n")
+                output_file.flush()
+                answered += 1
+                if answered % 100 == 0:
+                    logger.info(f"{answered}/{len(questions)} answered")
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+    search_pool.shutdown()
+    logger.info(f"Answered {answered} questions in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Batch question answering over an indexed PDF collection")
+    parser.add_argument("questions", help="input JSONL with one {\"id\", \"question\"} per line")
+    parser.add_argument("output", help="output JSONL of answers with citations")
+    parser.add_argument("--collection", required=True, help="collection the PDF was indexed into")
+    parser.add_argument("--model", default=CHAT_MODEL)
+    parser.add_argument("--embedding-model", default=os.getenv("EMBEDDING_MODEL"),
+                        help="embedding model the collection was built with")
+    parser.add_argument("--embedding-dimensions", type=int, default=int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None,
+                        help="shortened vector size the collection was built with")
+    parser.add_argument("--quantization", default=os.getenv("VECTOR_QUANTIZATION", "none").lower(),
+                        choices=["none", "scalar", "int8", "binary"], help="quantization the collection was created with")
+    parser.add_argument("--oversampling", type=float, default=float(os.getenv("QUANTIZATION_OVERSAMPLING", "2.0")),
+                        help="shortlist oversampling when rescoring quantized searches")
+    parser.add_argument("--k", type=int, default=int(os.getenv("RETRIEVAL_K", "3")))
+    parser.add_argument("--context-tokens", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--candidates", type=int, default=int(os.getenv("RETRIEVAL_CANDIDATES", "10")))
+    parser.add_argument("--concurrency", type=int, default=16, help="completions in flight at once")
+    asyncio.run(answer_all(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from .retrieval import matches_filter
+
+BM25_DIR = Path(os.getenv("BM25_INDEX_DIR", Path(__file__).parent.parent / ".bm25"))
+
+# Identifiers like fs.readFile, process.env.NODE_ENV, ERR_HTTP_HEADERS_SENT
+# and version numbers stay whole so exact lookups still match
+TOKEN_PATTERN = re.compile(r"[A-Za-z_$][\w$]*(?:\.[\w$]+)*|\d+(?:\.\d+)*")
+
+
+def tokenize(text: str) -> list:
+    """Lower-cased terms, plus the parts of dotted identifiers"""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text):
+        term = match.group().lower()
+        terms.append(term)
+        if "." in term and not term[0].isdigit():
+            terms.extend(part for part in term.split(".") if part)
+    return terms
+
+
+class BM25Index:
+    """Inverted-index BM25 retriever persisted next to a vector collection"""
+
+    def __init__(self, collection_name: str, directory: Path = BM25_DIR, k1: float = 1.5, b: float = 0.75):
+        self.collection_name = collection_name
+        self.path = Path(directory) / f"{collection_name}.json"
+        self.k1 = k1
+        self.b = b
+        self.documents = {}   # id -> {"page_content", "metadata", "length"}
+        self.postings = {}    # term -> {id: term frequency}
+        self.total_length = 0
+        self._lock = threading.RLock()
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            self.documents = data["documents"]
+            self.postings = data["postings"]
+            self.total_length = sum(doc["length"] for doc in self.documents.values())
+
+    def add(self, ids, documents):
+        """Index documents, replacing any previously indexed under the same IDs"""
+        with self._lock:
+            self.remove(ids)
+            for point_id, document in zip(ids, documents):
+                point_id = str(point_id)
+                counts = Counter(tokenize(document.page_content))
+                length = sum(counts.values())
+                self.documents[point_id] = {
+                    "page_content": document.page_content,
+                    "metadata": document.metadata,
+                    "length": length,
+                }
+                self.total_length += length
+                for term, count in counts.items():
+                    self.postings.setdefault(term, {})[point_id] = count
+
+    def remove(self, ids):
+        with self._lock:
+            for point_id in map(str, ids):
+                document = self.documents.pop(point_id, None)
+                if document is None:
+                    continue
+                self.total_length -= document["length"]
+                for term in set(tokenize(document["page_content"])):
+                    postings = self.postings.get(term)
+                    if postings is not None:
+                        postings.pop(point_id, None)
+                        if not postings:
+                            del self.postings[term]
+
+    def search(self, query: str, k: int = 4, filter=None) -> list:
+        """Return the k best (Document, score) pairs for the query
+
+        filter ({field: value or list of values}) limits results by metadata.
+        """
+        with self._lock:
+            count = len(self.documents)
+            if not count:
+                return []
+            average_length = self.total_length / count
+            scores = Counter()
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for point_id, frequency in postings.items():
+                    length = self.documents[point_id]["length"]
+                    scores[point_id] += idf * frequency * (self.k1 + 1) / (
+                        frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                    )
+            results = []
+            for point_id, score in scores.most_common(None if filter else k):
+                if len(results) == k:
+                    break
+                document = self.documents[point_id]
+                if filter and not matches_filter(document["metadata"], filter):
+                    continue
+                metadata = {**document["metadata"], "_id": point_id, "_collection_name": self.collection_name}
+                results.append((Document(page_content=document["page_content"], metadata=metadata), score))
+            return results
+
+    def reset(self):
+        with self._lock:
+            self.documents, self.postings, self.total_length = {}, {}, 0
+            self.save()
+
+    def save(self):
+        """Atomically write the index to disk"""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".json.tmp")
+            tmp_path.write_text(json.dumps({"documents": self.documents, "postings": self.postings}))
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,114 @@
+import os
+
+from langchain_core.documents import Document
+
+from .tokens import count_tokens_batch, get_encoding
+
+# Most tokens of retrieved text sent to the model per question
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+
+# A span is cut to fit the remaining budget only if this much room is left
+MIN_PARTIAL_TOKENS = 64
+
+
+def _page_key(metadata: dict) -> tuple:
+    return metadata.get("doc_id") or metadata.get("source"), metadata.get("page")
+
+
+def merge_chunks(results) -> list:
+    """Merge overlapping and adjacent chunks of the same page into single spans
+
+    Chunks need a start_index (set by TokenChunker) to be merged; without one
+    only exact and contained duplicates are dropped. Spans come back in the
+    order of their most relevant chunk.
+    """
+    pages = {}
+    for rank, document in enumerate(results):
+        pages.setdefault(_page_key(document.metadata), []).append((rank, document))
+
+    spans = []  # (rank, start, text, metadata)
+    for chunks in pages.values():
+        if any(document.metadata.get("start_index") is None for _, document in chunks):
+            kept = []
+            for rank, document in sorted(chunks, key=lambda item: -len(item[1].page_content)):
+                if not any(document.page_content in other for _, other in kept):
+                    kept.append((rank, document.page_content))
+                    spans.append((rank, None, document.page_content, document.metadata))
+            continue
+
+        current = None
+        positioned = sorted(chunks, key=lambda item: (item[1].metadata["start_index"], item[0]))
+        for rank, document in positioned:
+            start = document.metadata["start_index"]
+            text = document.page_content
+            if current is not None:
+                current_rank, current_start, current_text, metadata = current
+                current_end = current_start + len(current_text)
+                overlap = current_end - start
+                # Only merge text that really lines up, not two versions of a page
+                if overlap >= 0 and current_text[len(current_text) - overlap:] == text[:overlap]:
+                    best = min(current_rank, rank)
+                    if best == rank:
+                        metadata = document.metadata
+                    current = (best, current_start, current_text + text[overlap:], metadata)
+                    continue
+                spans.append(current)
+            current = (rank, start, text, document.metadata)
+        spans.append(current)
+
+    merged = []
+    for rank, start, text, metadata in sorted(spans, key=lambda span: span[0]):
+        metadata = {key: value for key, value in metadata.items() if key != "token_count"}
+        if start is not None:
+            metadata["start_index"] = start
+        merged.append(Document(page_content=text, metadata=metadata))
+    return merged
+
+
+def pack_context(
+    results,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    model: str = "gpt-4o-mini",
+    render=None,
+    separator: str = "\n\n\n",
+) -> list:
+    """Deduplicate retrieved chunks and keep the most relevant spans that fit the budget
+
+    render(document) is how each span appears in the prompt (default: its
+    text), so the budget covers the exact rendered context.
+    """
+    render = render or (lambda document: document.page_content)
+    encoding = get_encoding(model)
+    count = lambda text: len(encoding.encode_ordinary(text))
+    separator_tokens = count(separator)
+
+    spans = merge_chunks(results)
+    # One multi-threaded batch encode for every candidate span
+    span_tokens = count_tokens_batch([render(span) for span in spans], model)
+
+    packed, used = [], 0
+    for span, tokens in zip(spans, span_tokens):
+        joint = separator_tokens if packed else 0
+        cost = tokens + joint
+        if used + cost <= token_budget:
+            packed.append(span)
+            used += cost
+            continue
+        # Cut the best span that doesn't fit to fill what's left
+        frame = count(render(Document(page_content="", metadata=span.metadata)))
+        room = token_budget - used - joint - frame
+        if room >= MIN_PARTIAL_TOKENS:
+            content = encoding.decode(encoding.encode_ordinary(span.page_content)[:room])
+            packed.append(Document(page_content=content, metadata=span.metadata))
+            break
+
+    # Tokens can merge across the seams, so check the rendered total
+    while packed:
+        excess = count(separator.join(render(document) for document in packed)) - token_budget
+        if excess <= 0:
+            break
+        last = packed.pop()
+        content_tokens = encoding.encode_ordinary(last.page_content)
+        if len(content_tokens) > excess:
+            packed.append(Document(page_content=encoding.decode(content_tokens[:-excess]), metadata=last.metadata))
+    return packed
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from pathlib import Path
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path(os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    Path.home() / ".cache" / "genai" / "embeddings.sqlite3"
+))
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share a cache entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    """Build the cache key from the model name and the normalized text"""
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def embeddings_model_key(embeddings) -> str:
+    """Identify a LangChain embeddings object, including reduced dimensions"""
+    model = getattr(embeddings, "model", None) or type(embeddings).__name__
+    dimensions = getattr(embeddings, "dimensions", None)
+    return f"{model}@{dimensions}" if dimensions else model
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding store with LRU eviction and hit/miss counters"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, texts) -> list:
+        """Look up vectors for texts, returning None for each miss"""
+        keys = [cache_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model: str, texts, vectors):
+        """Store vectors as float32 blobs and evict the least recently used"""
+        now = time.time()
+        rows = [
+            (cache_key(model, text), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop the oldest entries once the cache grows past max_entries"""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            logger.info(f"Evicted {excess} embeddings from cache")
+
+    def stats(self) -> dict:
+        """Report hit/miss counters for this process"""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CacheLookup:
+    """Cached vectors for a batch of texts, and the distinct texts still to embed"""
+
+    def __init__(self, cache: EmbeddingCache, model: str, texts):
+        self.cache = cache
+        self.model = model
+        self.texts = list(texts)
+        self.vectors = cache.get_many(model, self.texts)
+        # Embed each distinct missing text once
+        self.missing = list(dict.fromkeys(
+            text for text, vector in zip(self.texts, self.vectors) if vector is None
+        ))
+
+    def complete(self, embedded) -> list:
+        """Store the vectors embedded for the misses and return every text's vector"""
+        if not self.missing:
+            return self.vectors
+        embedded = list(embedded)
+        self.cache.put_many(self.model, self.missing, embedded)
+        fresh = dict(zip(self.missing, embedded))
+        return [fresh[text] if vector is None else vector for text, vector in zip(self.texts, self.vectors)]
+
+
+def embed_with_cache(cache: EmbeddingCache, model: str, texts, embed_fn) -> list:
+    """Return vectors for texts, calling embed_fn only for the cache misses"""
+    lookup = CacheLookup(cache, model, texts)
+    return lookup.complete(embed_fn(lookup.missing) if lookup.missing else [])
+
+
+async def aembed_with_cache(cache: EmbeddingCache, model: str, texts, embed_fn) -> list:
+    """Async embed_with_cache: embed_fn is awaited, and the SQLite I/O runs off the event loop"""
+    lookup = await asyncio.to_thread(CacheLookup, cache, model, texts)
+    if not lookup.missing:
+        return lookup.vectors
+    return await asyncio.to_thread(lookup.complete, await embed_fn(lookup.missing))
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings wrapper that serves repeated texts from the cache"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache = None):
+        self.embeddings = embeddings
+        self.cache = cache or EmbeddingCache()
+        self.model_key = embeddings_model_key(embeddings)
+
+    def embed_documents(self, texts: list) -> list:
+        return embed_with_cache(self.cache, self.model_key, texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> list:
+        return embed_with_cache(
+            self.cache, self.model_key, [text],
+            lambda texts: [self.embeddings.embed_query(texts[0])]
+        )[0]
+
+    async def aembed_documents(self, texts: list) -> list:
+        return await aembed_with_cache(self.cache, self.model_key, texts, self.embeddings.aembed_documents)
+
+    async def aembed_query(self, text: str) -> list:
+        async def embed_fn(texts):
+            return [await self.embeddings.aembed_query(texts[0])]
+
+        return (await aembed_with_cache(self.cache, self.model_key, [text], embed_fn))[0]
+
+
+def openai_embeddings(model: str = None, dimensions: int = None, cache: EmbeddingCache = None, **kwargs) -> CachedEmbeddings:
+    """Cached OpenAIEmbeddings for a model and optional shortened (Matryoshka) dimensions
+
+    Shared by the app and the command-line tools, so queries are embedded
+    exactly as their collection was indexed.
+    """
+    from langchain_openai import OpenAIEmbeddings
+
+    if model:
+        kwargs["model"] = model
+    if dimensions:
+        kwargs["dimensions"] = dimensions
+    return CachedEmbeddings(OpenAIEmbeddings(**kwargs), cache=cache)
+
+
+def create_embeddings(client, cache: EmbeddingCache, model: str, texts, **kwargs) -> list:
+    """Cached equivalent of client.embeddings.create(...) returning plain vectors"""
+    model_key = f"{model}@{kwargs['dimensions']}" if kwargs.get("dimensions") else model
+
+    def embed_fn(batch):
+        response = client.embeddings.create(model=model, input=batch, **kwargs)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    return embed_with_cache(cache, model_key, texts, embed_fn)
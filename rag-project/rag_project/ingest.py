@@ -0,0 +1,302 @@
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import tiktoken
+from qdrant_client import models
+
+logger = logging.getLogger(__name__)
+
+# OpenAI accepts at most 2048 inputs and 300k tokens per embeddings request
+DEFAULT_MAX_BATCH_TOKENS = 100_000
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_CONCURRENCY = 4
+
+_DONE = object()
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Detect a 429 from the OpenAI SDK or anything wrapping it"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _retry_after(error: Exception):
+    """Read the server's Retry-After hint in seconds, if it sent one"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveBackoff:
+    """Shared throttle: grows on 429s, decays on success, slows every worker"""
+
+    def __init__(self, initial: float = 1.0, maximum: float = 60.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.delay = 0.0
+        self.rate_limits = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Pause before a request while the API is pushing back"""
+        delay = self.delay
+        if delay:
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def on_rate_limit(self, retry_after=None):
+        with self._lock:
+            self.rate_limits += 1
+            self.delay = min(self.maximum, max(self.initial, self.delay * 2, retry_after or 0))
+            logger.warning(f"Embedding rate limited, backing off {self.delay:.1f}s")
+
+    def on_success(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > 0.05 else 0.0
+
+
+@dataclass
+class IngestionStats:
+    pages: int = 0
+    total_pages: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    skipped: int = 0
+    batches: int = 0
+    rate_limited: int = 0
+    elapsed: float = 0.0
+    ids: list = field(default_factory=list)
+    embed_seconds: list = field(default_factory=list)    # per batch, retries included
+    upsert_seconds: list = field(default_factory=list)   # per batch
+
+
+class IngestionPipeline:
+    """Load → split → embed → upsert, with the stages running concurrently
+
+    Stages are connected by bounded queues, so a slow stage applies
+    backpressure upstream instead of letting pages pile up in memory.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        upsert,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        queue_size: int = 8,
+        max_retries: int = 8,
+        encoding_name: str = "cl100k_base",
+    ):
+        self.embeddings = embeddings
+        self.upsert = upsert
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.backoff = AdaptiveBackoff()
+
+    def run(self, pages, split, chunk_id=None, skip=None, progress=None) -> IngestionStats:
+        """Ingest an iterable of page Documents
+
+        split(page) returns the page's chunks, chunk_id(chunk) gives its point
+        ID and skip(id) lets already-indexed chunks bypass embedding.
+        progress(stats) is called after every page parsed and batch stored.
+        """
+        stats = IngestionStats()
+        stop = threading.Event()
+        errors = []
+        page_queue = queue.Queue(self.queue_size)
+        batch_queue = queue.Queue(self.queue_size)
+        upsert_queue = queue.Queue(self.queue_size)
+        rate_limits_before = self.backoff.rate_limits
+        started = time.perf_counter()
+
+        def put(q, item):
+            # Give up instead of blocking forever once another stage failed
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def stage(fn):
+            def wrapper(*args):
+                try:
+                    fn(*args)
+                except Exception as e:
+                    logger.error(f"Ingestion stage {fn.__name__} failed: {str(e)}")
+                    errors.append(e)
+                    stop.set()
+            return threading.Thread(target=wrapper, name=f"ingest-{fn.__name__}", daemon=True)
+
+        def load():
+            for page in pages:
+                if not put(page_queue, page):
+                    return
+                stats.pages += 1
+                stats.total_pages = page.metadata.get("total_pages", stats.total_pages)
+                if progress:
+                    progress(stats)
+            put(page_queue, _DONE)
+
+        def split_and_batch():
+            batch, batch_tokens = [], 0
+            while (page := get(page_queue)) is not _DONE:
+                for chunk in split(page):
+                    point_id = chunk_id(chunk) if chunk_id else str(uuid.uuid4())
+                    stats.chunks += 1
+                    stats.ids.append(point_id)
+                    if skip and skip(point_id):
+                        stats.skipped += 1
+                        continue
+                    # Token-aware splitters already counted the chunk
+                    tokens = chunk.metadata.get("token_count") or len(self.encoding.encode(chunk.page_content))
+                    if batch and (batch_tokens + tokens > self.max_batch_tokens
+                                  or len(batch) >= self.max_batch_size):
+                        if not put(batch_queue, batch):
+                            return
+                        batch, batch_tokens = [], 0
+                    batch.append((point_id, chunk))
+                    batch_tokens += tokens
+            if batch:
+                put(batch_queue, batch)
+            for _ in range(self.max_concurrency):
+                put(batch_queue, _DONE)
+
+        def embed():
+            while (batch := get(batch_queue)) is not _DONE:
+                batch_started = time.perf_counter()
+                vectors = self._embed_with_backoff([chunk.page_content for _, chunk in batch])
+                stats.embed_seconds.append(time.perf_counter() - batch_started)
+                if not put(upsert_queue, (batch, vectors)):
+                    return
+            put(upsert_queue, _DONE)
+
+        def upsert():
+            finished_workers = 0
+            while finished_workers < self.max_concurrency:
+                item = get(upsert_queue)
+                if item is _DONE:
+                    if stop.is_set():
+                        return
+                    finished_workers += 1
+                    continue
+                batch, vectors = item
+                batch_started = time.perf_counter()
+                self.upsert([point_id for point_id, _ in batch], [chunk for _, chunk in batch], vectors)
+                stats.upsert_seconds.append(time.perf_counter() - batch_started)
+                stats.embedded += len(batch)
+                stats.batches += 1
+                if progress:
+                    progress(stats)
+
+        threads = [stage(load), stage(split_and_batch), stage(upsert)]
+        threads += [stage(embed) for _ in range(self.max_concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats.elapsed = time.perf_counter() - started
+        stats.rate_limited = self.backoff.rate_limits - rate_limits_before
+        if errors:
+            raise errors[0]
+        logger.info(
+            f"Ingested {stats.pages} pages / {stats.chunks} chunks: {stats.embedded} embedded, "
+            f"{stats.skipped} unchanged, {stats.rate_limited} rate limits, {stats.elapsed:.1f}s"
+        )
+        return stats
+
+    def _embed_with_backoff(self, texts) -> list:
+        for attempt in range(self.max_retries + 1):
+            self.backoff.wait()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self.backoff.on_rate_limit(_retry_after(e))
+                continue
+            self.backoff.on_success()
+            return vectors
+
+
+def qdrant_upserter(
+    client,
+    collection_name: str,
+    vector_name: str = "",
+    content_payload_key: str = "page_content",
+    metadata_payload_key: str = "metadata",
+    quantization_config=None,
+):
+    """Build an upsert callback writing LangChain-compatible points to Qdrant
+
+    A collection created here keeps full-precision vectors on disk when
+    quantization_config is given, with the quantized copy in RAM.
+    """
+    lock = threading.Lock()
+    ready = []
+
+    def upsert(ids, documents, vectors):
+        with lock:
+            if not ready:
+                if not client.collection_exists(collection_name):
+                    vector_params = models.VectorParams(
+                        size=len(vectors[0]),
+                        distance=models.Distance.COSINE,
+                        on_disk=quantization_config is not None
+                    )
+                    client.create_collection(
+                        collection_name,
+                        vectors_config={vector_name: vector_params} if vector_name else vector_params,
+                        quantization_config=quantization_config
+                    )
+                ready.append(True)
+        client.upsert(
+            collection_name=collection_name,
+            points=[
+                models.PointStruct(
+                    id=point_id,
+                    vector={vector_name: vector} if vector_name else vector,
+                    payload={
+                        content_payload_key: document.page_content,
+                        metadata_payload_key: document.metadata,
+                    },
+                )
+                for point_id, document, vector in zip(ids, documents, vectors)
+            ],
+        )
+
+    return upsert
+
+
+def vector_store_upserter(vector_store):
+    """Build the upsert callback matching a vector store's backend"""
+    if hasattr(vector_store, "add_vectors"):
+        return vector_store.add_vectors
+    return qdrant_upserter(
+        vector_store.client,
+        vector_store.collection_name,
+        vector_name=vector_store.vector_name,
+        content_payload_key=vector_store.content_payload_key,
+        metadata_payload_key=vector_store.metadata_payload_key,
+    )
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .manifest import file_digest
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = Path(os.getenv("INGEST_JOBS_DIR", Path(__file__).parent.parent / ".jobs"))
+
+# Finished jobs are forgotten after a day
+JOB_RETENTION = 24 * 3600
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Progress from the pipeline threads is written at most this often
+SAVE_INTERVAL = 0.5
+
+
+class IngestionJobs:
+    """Bounded background pool for ingesting uploads, with job state persisted as JSON
+
+    run(data, filename, collection_name, progress, **params) does the work;
+    it reports progress by calling progress(**fields) and may return extra
+    fields for the finished job. Uploads are kept on disk until their job
+    finishes, so jobs interrupted by a restart are picked up again. A new
+    version of a document uploaded while it is being indexed is queued to
+    run once the current job finishes.
+    """
+
+    def __init__(self, run, max_workers: int = 2, directory: Path = JOBS_DIR):
+        self.run = run
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ingest-job")
+        self._jobs = {}
+        self._last_saved = {}
+        self._lock = threading.Lock()
+        self._recover()
+
+    def _state_path(self, job_id: str) -> Path:
+        return self.directory / f"{job_id}.json"
+
+    def _upload_path(self, job_id: str) -> Path:
+        return self.directory / f"{job_id}.pdf"
+
+    def _recover(self):
+        now = time.time()
+        resumed = []
+        for path in self.directory.glob("*.json"):
+            try:
+                job = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if job["status"] not in ACTIVE_STATUSES:
+                if now - job.get("updated_at", 0) > JOB_RETENTION:
+                    path.unlink(missing_ok=True)
+                else:
+                    self._jobs[job["id"]] = job
+                continue
+            if not self._upload_path(job["id"]).exists():
+                job.update(status="failed", error="Upload lost before the job finished", updated_at=now)
+                self._jobs[job["id"]] = job
+                self._save(job)
+                continue
+            logger.info(f"Resuming ingestion of '{job['filename']}' (job {job['id']})")
+            job.update(status="queued", updated_at=now)
+            self._jobs[job["id"]] = job
+            self._save(job)
+            resumed.append(job["id"])
+        for job_id in resumed:
+            # Follow-up jobs still wait for the job they were queued behind
+            if not self._waiting(self._jobs[job_id]):
+                self._executor.submit(self._work, job_id)
+
+    def _waiting(self, job: dict) -> bool:
+        previous = self._jobs.get(job.get("after"))
+        return previous is not None and previous["status"] in ACTIVE_STATUSES
+
+    def _save(self, job: dict):
+        """Atomically write one job's state"""
+        path = self._state_path(job["id"])
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(job))
+        os.replace(tmp_path, path)
+        self._last_saved[job["id"]] = time.monotonic()
+
+    def submit(self, data: bytes, filename: str, collection_name: str, key: str = None, **params) -> str:
+        """Queue an upload and return its job ID
+
+        key identifies the document within the collection (default: the
+        filename); params are passed through to run(). Uploading the same
+        bytes again returns the job already indexing them. Different bytes
+        replace the upload of a job that has not started yet, or else are
+        queued behind the running job.
+        """
+        key = key or filename
+        digest = file_digest(data)
+        with self._lock:
+            active = [
+                job for job in self._jobs.values()
+                if (job["collection_name"], job.get("key")) == (collection_name, key) and job["status"] in ACTIVE_STATUSES
+            ]
+            for job in active:
+                if job.get("digest") == digest:
+                    return job["id"]
+            queued = [job for job in active if job["status"] == "queued"]
+            if queued:
+                # Not started yet, so it can index the newest version instead
+                job = queued[-1]
+                self._upload_path(job["id"]).write_bytes(data)
+                job.update(filename=filename, params=params, digest=digest, updated_at=time.time())
+                self._save(job)
+                return job["id"]
+            # Two jobs indexing one document at once would race on its manifest entry
+            after = active[-1]["id"] if active else None
+            job_id = uuid.uuid4().hex
+            self._upload_path(job_id).write_bytes(data)
+            now = time.time()
+            job = {
+                "id": job_id,
+                "filename": filename,
+                "collection_name": collection_name,
+                "key": key,
+                "digest": digest,
+                "after": after,
+                "params": params,
+                "status": "queued",
+                "pages": 0,
+                "total_pages": 0,
+                "chunks": 0,
+                "embedded": 0,
+                "skipped": 0,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            self._jobs[job_id] = job
+            self._save(job)
+        if after is None:
+            self._executor.submit(self._work, job_id)
+        return job_id
+
+    def update(self, job_id: str, force: bool = False, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=time.time())
+            if force or time.monotonic() - self._last_saved.get(job_id, 0) >= SAVE_INTERVAL:
+                self._save(job)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _work(self, job_id: str):
+        with self._lock:
+            # From here on, a newer upload of the document queues a follow-up job
+            job = self._jobs[job_id]
+            job.update(status="running", updated_at=time.time())
+            self._save(job)
+            job = dict(job)
+        try:
+            data = self._upload_path(job_id).read_bytes()
+            result = self.run(
+                data,
+                job["filename"],
+                job["collection_name"],
+                lambda **fields: self.update(job_id, **fields),
+                **job.get("params", {})
+            )
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} for '{job['filename']}' failed: {str(e)}")
+            self.update(job_id, status="failed", error=str(e), force=True)
+        else:
+            self.update(job_id, status="done", force=True, **(result or {}))
+        self._upload_path(job_id).unlink(missing_ok=True)
+        with self._lock:
+            followers = [job["id"] for job in self._jobs.values() if job.get("after") == job_id and job["status"] == "queued"]
+        for follower in followers:
+            self._executor.submit(self._work, follower)
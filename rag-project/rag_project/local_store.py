@@ -0,0 +1,354 @@
+import json
+import logging
+import math
+import os
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from .quantization import int8_bound, int8_scores, quantize_int8, rescore, top_k
+from .retrieval import matches_filter
+
+logger = logging.getLogger(__name__)
+
+# Try to import optional dependencies
+try:
+    import hnswlib
+    HNSW_AVAILABLE = True
+except ImportError:
+    HNSW_AVAILABLE = False
+
+DEFAULT_PATH = Path(os.getenv("LOCAL_VECTOR_PATH", Path(__file__).parent.parent / ".vectors"))
+
+# Brute force beats building a graph until collections get this large
+HNSW_THRESHOLD = int(os.getenv("LOCAL_HNSW_THRESHOLD", "50000"))
+
+# "int8" keeps a quarter-size copy of the vectors in RAM for the exact scan and
+# rescores the best candidates from the full-precision file. Binary
+# quantization is Qdrant-only; here it falls back to int8.
+QUANTIZATION = "none" if os.getenv("VECTOR_QUANTIZATION", "none").lower() == "none" else "int8"
+OVERSAMPLING = float(os.getenv("QUANTIZATION_OVERSAMPLING", "2.0"))
+
+# Metadata fields with an in-memory value -> rows index, like Qdrant payload indexes
+PAYLOAD_INDEX_FIELDS = ("doc_id", "owner")
+
+
+def _write_meta(directory: Path, meta: dict):
+    """Atomically replace meta.json; it is written after the data files, so it marks a complete collection"""
+    tmp_path = directory / "meta.json.tmp"
+    tmp_path.write_text(json.dumps(meta))
+    os.replace(tmp_path, directory / "meta.json")
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store: a drop-in for QdrantVectorStore on small setups
+
+    Unit-normalized float32 vectors are appended to a memory-mapped file and
+    documents to a JSONL log. Search is a NumPy matrix-vector product, or an
+    HNSW graph (when hnswlib is installed) once the collection is large.
+    """
+
+    def __init__(
+        self,
+        path,
+        collection_name: str,
+        embedding=None,
+        hnsw_threshold: int = HNSW_THRESHOLD,
+        quantization: str = QUANTIZATION,
+        oversampling: float = OVERSAMPLING,
+    ):
+        self.collection_name = collection_name
+        self.directory = Path(path) / collection_name
+        self.embedding = embedding
+        self.hnsw_threshold = hnsw_threshold
+        self.quantization = quantization
+        self.oversampling = oversampling
+        self._lock = threading.RLock()
+        self._dim = None
+        self._records = []      # row -> {"id", "page_content", "metadata"} or None once dead
+        self._rows = {}         # id -> live row
+        self._dead = set()      # rows replaced or deleted since they were written
+        self._payload_rows = {field: {} for field in PAYLOAD_INDEX_FIELDS}  # field -> value -> live rows
+        self._vectors = None    # memory map over vectors.f32
+        self._hnsw = None
+        self._quantized = None  # int8 copy of the vectors, when quantized
+        self._int8_bound = None
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.directory / "meta.json"
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / "vectors.f32"
+
+    @property
+    def _records_path(self) -> Path:
+        return self.directory / "records.jsonl"
+
+    @staticmethod
+    def collection_exists(collection_name: str, path=DEFAULT_PATH) -> bool:
+        return (Path(path) / collection_name / "meta.json").exists()
+
+    def _load(self):
+        if not self._meta_path.exists():
+            return
+        meta = json.loads(self._meta_path.read_text())
+        self._dim = meta["dim"]
+        self._int8_bound = meta.get("int8_bound")
+        with open(self._records_path) as records_file:
+            for line in records_file:
+                entry = json.loads(line)
+                if "delete" in entry:
+                    row = self._rows.pop(entry["delete"], None)
+                    if row is not None:
+                        self._retire(row)
+                    continue
+                if entry["id"] in self._rows:
+                    self._retire(self._rows[entry["id"]])
+                self._rows[entry["id"]] = len(self._records)
+                self._index_payload(len(self._records), entry)
+                self._records.append(entry)
+        rows_on_disk = self._vectors_path.stat().st_size // (4 * self._dim)
+        if rows_on_disk < len(self._records):
+            raise ValueError(f"Local collection '{self.collection_name}' is missing vectors")
+        if rows_on_disk > len(self._records):
+            # A crash between the two appends left vectors without records
+            os.truncate(self._vectors_path, len(self._records) * 4 * self._dim)
+
+    def _matrix(self) -> np.ndarray:
+        if self._vectors is None or len(self._vectors) != len(self._records):
+            self._vectors = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(len(self._records), self._dim)
+            ) if self._records else np.empty((0, self._dim or 0), dtype=np.float32)
+        return self._vectors
+
+    def add_vectors(self, ids, documents, vectors) -> list:
+        """Store precomputed vectors, replacing any existing points with the same IDs"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        ids = [str(point_id) if point_id is not None else str(uuid.uuid4()) for point_id in ids]
+        with self._lock:
+            # A new collection starts its files afresh, dropping anything a failed first write left behind
+            creating = self._dim is None
+            if creating:
+                self._dim = vectors.shape[1]
+                self.directory.mkdir(parents=True, exist_ok=True)
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Expected {self._dim}-d vectors, got {vectors.shape[1]}-d")
+
+            first_row = len(self._records)
+            with open(self._vectors_path, "wb" if creating else "ab") as vectors_file:
+                vectors_file.write(vectors.tobytes())
+            with open(self._records_path, "w" if creating else "a") as records_file:
+                for point_id, document in zip(ids, documents):
+                    entry = {"id": point_id, "page_content": document.page_content, "metadata": document.metadata}
+                    records_file.write(json.dumps(entry) + "\n")
+                    if point_id in self._rows:
+                        self._retire(self._rows[point_id])
+                    self._rows[point_id] = len(self._records)
+                    self._index_payload(len(self._records), entry)
+                    self._records.append(entry)
+            if creating:
+                _write_meta(self.directory, {"dim": self._dim})
+            if self._hnsw is not None:
+                self._hnsw.resize_index(len(self._records))
+                self._hnsw.add_items(vectors, np.arange(first_row, len(self._records)))
+        return ids
+
+    def _index_payload(self, row: int, entry: dict):
+        for field, values in self._payload_rows.items():
+            value = entry["metadata"].get(field)
+            if value is not None:
+                values.setdefault(value, set()).add(row)
+
+    def _retire(self, row: int):
+        for field, values in self._payload_rows.items():
+            value = self._records[row]["metadata"].get(field)
+            if value is not None:
+                values[value].discard(row)
+        self._records[row] = None
+        self._dead.add(row)
+        if self._hnsw is not None:
+            self._hnsw.mark_deleted(row)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs) -> list:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [None] * len(texts)
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return self.add_vectors(ids, documents, self.embedding.embed_documents(texts))
+
+    def delete(self, ids=None, **kwargs) -> bool:
+        with self._lock:
+            removed = [str(point_id) for point_id in ids or [] if str(point_id) in self._rows]
+            if not removed:
+                return True
+            with open(self._records_path, "a") as records_file:
+                for point_id in removed:
+                    records_file.write(json.dumps({"delete": point_id}) + "\n")
+                    self._retire(self._rows.pop(point_id))
+        return True
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _filter_rows(self, conditions) -> np.ndarray:
+        """Live rows whose metadata matches {field: value or list of values}"""
+        rows = None
+        scanned = {}
+        for field, value in conditions.items():
+            if field not in self._payload_rows:
+                scanned[field] = value
+                continue
+            accepted = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+            field_rows = set().union(*(self._payload_rows[field].get(item, ()) for item in accepted))
+            rows = field_rows if rows is None else rows & field_rows
+        if rows is None:
+            rows = self._rows.values()
+        if scanned:
+            rows = [row for row in rows if matches_filter(self._records[row]["metadata"], scanned)]
+        return np.fromiter(sorted(rows), dtype=np.int64)
+
+    def _quantized_matrix(self) -> np.ndarray:
+        """int8 copy of the vectors, extended with rows added since the last search"""
+        matrix = self._matrix()
+        if self._int8_bound is None:
+            # The clipping bound is fixed once so earlier rows stay comparable
+            self._int8_bound = int8_bound(matrix[:10_000])
+            meta = json.loads(self._meta_path.read_text())
+            _write_meta(self.directory, {**meta, "int8_bound": self._int8_bound})
+        done = 0 if self._quantized is None else len(self._quantized)
+        if done < len(matrix):
+            new_rows = [quantize_int8(matrix[start:start + 65536], self._int8_bound)
+                        for start in range(done, len(matrix), 65536)]
+            self._quantized = np.concatenate(([self._quantized] if done else []) + new_rows)
+        return self._quantized
+
+    def _search_rows(self, query: np.ndarray, k: int, rows=None):
+        """Return (row, score) pairs of the k nearest live rows, optionally among `rows`"""
+        candidates = len(self._rows) if rows is None else len(rows)
+        if candidates >= self.hnsw_threshold and HNSW_AVAILABLE:
+            index = self._hnsw_index()
+            if rows is None:
+                labels, distances = index.knn_query(query, k=min(k, candidates))
+            else:
+                allowed = set(rows.tolist())
+                labels, distances = index.knn_query(
+                    query, k=min(k, candidates), num_threads=1, filter=allowed.__contains__
+                )
+            return [(int(row), 1.0 - float(distance)) for row, distance in zip(labels[0], distances[0])]
+
+        # Small filtered sets are scored directly
+        matrix = self._quantized_matrix() if self.quantization == "int8" else self._matrix()
+        if rows is not None:
+            matrix = matrix[rows]
+        if self.quantization == "int8":
+            scores = int8_scores(matrix, query, self._int8_bound)
+        else:
+            scores = matrix @ query
+        if rows is None and self._dead:
+            scores[list(self._dead)] = -np.inf
+        row_ids = np.arange(len(scores)) if rows is None else rows
+        k = min(k, candidates)
+
+        if self.quantization == "int8":
+            # Rescore an oversampled shortlist with the full-precision vectors
+            shortlist = top_k(scores, math.ceil(k * self.oversampling))
+            shortlist = shortlist[np.isfinite(scores[shortlist])]
+            best_rows, best_scores = rescore(row_ids[shortlist], self._matrix(), query, k)
+            return [(int(row), float(score)) for row, score in zip(best_rows, best_scores)]
+
+        top = top_k(scores, k)
+        return [(int(row_ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def _hnsw_index(self):
+        """Build the HNSW graph over all rows the first time it is needed"""
+        if self._hnsw is None:
+            logger.info(f"Building HNSW index for {len(self._rows)} vectors in '{self.collection_name}'")
+            index = hnswlib.Index(space="ip", dim=self._dim)
+            index.init_index(max_elements=max(len(self._records), 1), ef_construction=200, M=16)
+            index.add_items(np.asarray(self._matrix()), np.arange(len(self._records)))
+            for row in self._dead:
+                index.mark_deleted(row)
+            index.set_ef(64)
+            self._hnsw = index
+        return self._hnsw
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter=None, **kwargs) -> list:
+        """Nearest chunks, limited by `filter` ({field: value or list of values}) if given"""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        query = query / norm if norm else query
+        with self._lock:
+            rows = self._filter_rows(filter) if filter else None
+            if not self._rows or (rows is not None and not len(rows)):
+                return []
+            results = []
+            for row, score in self._search_rows(query, k, rows):
+                record = self._records[row]
+                metadata = {**record["metadata"], "_id": record["id"], "_collection_name": self.collection_name}
+                results.append((Document(page_content=record["page_content"], metadata=metadata), score))
+            return results
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs) -> list:
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> list:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts,
+        embedding,
+        metadatas=None,
+        ids=None,
+        collection_name: str = "default",
+        path=DEFAULT_PATH,
+        force_recreate: bool = False,
+        **kwargs,
+    ):
+        if force_recreate:
+            cls.drop_collection(collection_name, path)
+        store = cls(path, collection_name, embedding)
+        texts = list(texts)
+        if texts:
+            store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    @classmethod
+    def from_existing_collection(cls, collection_name: str, embedding=None, path=DEFAULT_PATH, **kwargs):
+        if not cls.collection_exists(collection_name, path):
+            raise ValueError(f"Local collection '{collection_name}' does not exist")
+        return cls(path, collection_name, embedding)
+
+    @staticmethod
+    def create_collection(collection_name: str, size: int, path=DEFAULT_PATH):
+        directory = Path(path) / collection_name
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / "vectors.f32").touch()
+        (directory / "records.jsonl").touch()
+        _write_meta(directory, {"dim": size})
+
+    @staticmethod
+    def drop_collection(collection_name: str, path=DEFAULT_PATH):
+        directory = Path(path) / collection_name
+        for name in ("meta.json", "vectors.f32", "records.jsonl"):
+            (directory / name).unlink(missing_ok=True)
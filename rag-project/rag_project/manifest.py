@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+
+# Where the per-collection manifests of embedded chunks are kept
+MANIFEST_DIR = Path(os.getenv("INDEX_MANIFEST_DIR", Path(__file__).parent.parent / ".index_manifests"))
+
+# Fixed namespace so the same chunk always maps to the same Qdrant point ID
+CHUNK_NAMESPACE = uuid.UUID("6f1c1f4e-3b0a-4c55-9d43-2f7a8a3d5e10")
+
+
+def file_digest(data: bytes) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def document_id(owner: str, filename: str) -> str:
+    """Stable ID of one user's document inside a shared collection"""
+    return hashlib.sha256(f"{owner}\x00{filename}".encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_id(doc_key: str, page, text: str) -> str:
+    """Derive a stable point ID from the document, page and chunk text"""
+    text_digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(CHUNK_NAMESPACE, f"{doc_key}\x00{page}\x00{text_digest}"))
+
+
+class IndexManifest:
+    """Local record of which chunks of each document are already in a collection"""
+
+    def __init__(self, collection_name: str, directory: Path = MANIFEST_DIR):
+        self.collection_name = collection_name
+        self.path = Path(directory) / f"{collection_name}.json"
+        self.documents = {}
+        if self.path.exists():
+            try:
+                self.documents = json.loads(self.path.read_text()).get("documents", {})
+            except (OSError, ValueError):
+                # A corrupt manifest only costs a full re-embed
+                self.documents = {}
+
+    def is_current(self, doc_key: str, digest: str) -> bool:
+        """Check whether this exact file version is already fully indexed"""
+        entry = self.documents.get(doc_key)
+        return bool(entry) and entry.get("digest") == digest
+
+    def chunk_ids(self, doc_key: str) -> set:
+        """Get the chunk IDs recorded for a document"""
+        return set(self.documents.get(doc_key, {}).get("chunks", []))
+
+    def record(self, doc_key: str, digest: str, ids, **info):
+        """Record the chunk IDs now stored for a document version, plus e.g. its filename and owner"""
+        self.documents[doc_key] = {**info, "digest": digest, "chunks": sorted(ids)}
+
+    def entries(self, **info) -> dict:
+        """Map document keys to their recorded info, optionally only those matching `info`"""
+        return {
+            doc_key: {key: value for key, value in entry.items() if key != "chunks"}
+            for doc_key, entry in self.documents.items()
+            if all(entry.get(key) == value for key, value in info.items())
+        }
+
+    def reset(self):
+        """Forget everything, e.g. after the collection was recreated"""
+        self.documents = {}
+        self.save()
+
+    def save(self):
+        """Atomically write the manifest to disk"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps({"documents": self.documents}))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,174 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Percentiles are taken over the most recent observations of each series
+HISTOGRAM_WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """Recent observations for percentiles, plus lifetime count and sum"""
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.values.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self) -> dict:
+        if not self.values:
+            return {}
+        return dict(zip(QUANTILES, np.quantile(np.fromiter(self.values, dtype=float), QUANTILES).tolist()))
+
+
+def _series_key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """In-process counters and rolling histograms, exported as Prometheus text or JSON"""
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self.window = window
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = RollingHistogram(self.window)
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """Time a block into the rag_stage_seconds histogram, errors included"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.increment("rag_stage_errors", stage=stage, **labels)
+            raise
+        finally:
+            self.observe("rag_stage_seconds", time.perf_counter() - started, stage=stage, **labels)
+
+    def _read(self) -> tuple:
+        """Every series read under the lock, so a histogram's count, sum and quantiles agree"""
+        with self._lock:
+            histograms = [(key, histogram.count, histogram.sum, histogram.quantiles())
+                          for key, histogram in sorted(self._histograms.items())]
+            counters = sorted(self._counters.items())
+        return histograms, counters
+
+    def snapshot(self) -> dict:
+        """Plain-dict view of every series, for JSON dumps and the UI"""
+        histograms, counters = self._read()
+        return {
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": count,
+                    "sum": total,
+                    **{f"p{round(q * 100)}": value for q, value in quantiles.items()},
+                }
+                for (name, labels), count, total, quantiles in histograms
+            ],
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in counters
+            ],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition: histograms as summaries, counters as *_total"""
+        lines = []
+        histograms, counters = self._read()
+        seen = set()
+        for (name, labels), count, total, quantiles in histograms:
+            if name not in seen:
+                lines.append(f"# TYPE {name} summary")
+                seen.add(name)
+            for quantile, value in quantiles.items():
+                lines.append(f"{name}{_format_labels(labels, [('quantile', quantile)])} {value}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name}_total counter")
+                seen.add(name)
+            lines.append(f"{name}_total{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Process-wide registry shared by the app, the ingestion threads and the exporter
+registry = MetricsRegistry()
+span = registry.span
+observe = registry.observe
+increment = registry.increment
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0", metrics_registry: MetricsRegistry = registry):
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                body, content_type = metrics_registry.to_prometheus(), "text/plain; version=0.0.4"
+            elif path == "/metrics.json":
+                body, content_type = metrics_registry.to_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would flood the app log
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,94 @@
+import io
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+# Below this many pages the process pool costs more than it saves
+PARALLEL_MIN_PAGES = 64
+PAGES_PER_TASK = 16
+
+# Per-worker reader, parsed once when the worker process starts
+_worker_reader = None
+
+
+def _init_worker(data: bytes):
+    global _worker_reader
+    _worker_reader = PdfReader(io.BytesIO(data))
+
+
+def _extract_page_range(page_range) -> list:
+    """Extract the text of pages [start, stop) in a worker process"""
+    start, stop = page_range
+    return [_worker_reader.pages[index].extract_text() for index in range(start, stop)]
+
+
+def _page_document(text: str, index: int, name: str, page_labels, total_pages: int) -> Document:
+    return Document(
+        page_content=text,
+        metadata={
+            "source": name,
+            "page": index,
+            "page_label": page_labels[index] if index < len(page_labels) else str(index + 1),
+            "total_pages": total_pages,
+        },
+    )
+
+
+def iter_pdf_pages(source, source_name: str = None, workers: int = 1):
+    """Yield one Document per PDF page, parsing each page only when requested
+
+    `source` is a path or any binary file object (e.g. a Streamlit upload),
+    which is read in place so no temporary copy is made. Metadata matches
+    PyPDFLoader's `source`, `page`, `page_label` and `total_pages` fields.
+    With workers > 1, large documents are extracted on a process pool and
+    still yielded in page order.
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as pdf_file:
+            yield from iter_pdf_pages(pdf_file, source_name or str(source), workers)
+        return
+
+    source.seek(0)
+    reader = PdfReader(source)
+    total_pages = len(reader.pages)
+    # page_labels is recomputed on every access, so read it once
+    page_labels = reader.page_labels
+    name = source_name or getattr(source, "name", "document.pdf")
+
+    if workers > 1 and total_pages >= PARALLEL_MIN_PAGES:
+        source.seek(0)
+        data = source.getvalue() if hasattr(source, "getvalue") else source.read()
+        pages = _extract_parallel(data, total_pages, workers)
+    else:
+        pages = (reader.pages[index].extract_text() for index in range(total_pages))
+
+    for index, text in enumerate(pages):
+        yield _page_document(text, index, name, page_labels, total_pages)
+
+
+def _extract_parallel(data: bytes, total_pages: int, workers: int):
+    """Yield page texts in order while a process pool extracts ahead"""
+    page_ranges = [
+        (start, min(start + PAGES_PER_TASK, total_pages))
+        for start in range(0, total_pages, PAGES_PER_TASK)
+    ]
+    # Spawned, not forked: a fork would copy the app's threads' held locks into the workers
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(data,)) as pool:
+        # Keep a bounded window of tasks in flight so memory stays flat
+        pending = deque()
+        next_range = iter(page_ranges)
+        for page_range in next_range:
+            pending.append(pool.submit(_extract_page_range, page_range))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            texts = pending.popleft().result()
+            for page_range in next_range:
+                pending.append(pool.submit(_extract_page_range, page_range))
+                break
+            yield from texts
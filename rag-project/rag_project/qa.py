@@ -0,0 +1,56 @@
+from .context import CONTEXT_TOKEN_BUDGET, pack_context
+
+CHAT_MODEL = "gpt-4o-mini"
+
+CONTEXT_SEPARATOR = "\n\n\n"
+
+
+def format_chunk(result) -> str:
+    return f"Page Content: {result.page_content}\nPage Number: {result.metadata.get('page_label', 'N/A')}\nFile Location: {result.metadata.get('source', 'N/A')}"
+
+
+def format_context(search_results) -> str:
+    """Render retrieved chunks with their page and file for the prompt"""
+    return CONTEXT_SEPARATOR.join([format_chunk(result) for result in search_results])
+
+
+def build_messages(question: str, search_results, token_budget: int = CONTEXT_TOKEN_BUDGET, model: str = CHAT_MODEL) -> list:
+    """Build the chat messages answering a question from retrieved chunks
+
+    Overlapping chunks are merged and the context is cut to token_budget.
+    """
+    context = format_context(pack_context(
+        search_results, token_budget=token_budget, model=model, render=format_chunk, separator=CONTEXT_SEPARATOR
+    ))
+
+    system_prompt = f"""
+        You are a PDF content AI assistant. Your job is to answer questions ONLY using information from the provided PDF context.
+
+        RULES:
+        - If the answer is in the PDF context below → Answer with page citation
+        - If the answer is NOT in the PDF context below → Say: "I'm sorry, I don't have information about that in this PDF. Please ask about something else from the document."
+        - Never use outside knowledge
+        - Never guess or infer beyond what's written
+        - Always cite the page number when possible
+
+        PDF Context:
+        {context}
+        """
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": question},
+    ]
+
+
+def citations(search_results) -> list:
+    """Distinct (source, page) references of the retrieved chunks, in rank order"""
+    seen = []
+    for result in search_results:
+        reference = {
+            "source": result.metadata.get("source", "N/A"),
+            "page": result.metadata.get("page_label", "N/A"),
+        }
+        if reference not in seen:
+            seen.append(reference)
+    return seen
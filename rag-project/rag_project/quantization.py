@@ -0,0 +1,97 @@
+import numpy as np
+from qdrant_client import models
+
+# Values beyond this quantile of |component| are clipped, as Qdrant does
+INT8_QUANTILE = 0.99
+
+# Rows converted back to float32 at a time when scanning int8 vectors
+SCAN_BLOCK_ROWS = 8192
+
+
+def truncate_dimensions(vectors, dimensions: int) -> np.ndarray:
+    """Matryoshka-style shortening: keep the leading dimensions and re-normalize
+
+    For the v3 OpenAI models this matches asking the API for `dimensions`.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)[..., :dimensions]
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def int8_bound(vectors, quantile: float = INT8_QUANTILE) -> float:
+    """Symmetric clipping bound mapped to ±127"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return float(np.quantile(np.abs(vectors), quantile)) or 1.0
+
+
+def quantize_int8(vectors, bound: float) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return np.clip(np.rint(vectors * (127.0 / bound)), -127, 127).astype(np.int8)
+
+
+def int8_scores(quantized: np.ndarray, query, bound: float) -> np.ndarray:
+    """Approximate inner products of an int8 matrix with a float query
+
+    Converted block by block so the float32 copy never exists all at once.
+    """
+    query = np.asarray(query, dtype=np.float32) * (bound / 127.0)
+    scores = np.empty(len(quantized), dtype=np.float32)
+    for start in range(0, len(quantized), SCAN_BLOCK_ROWS):
+        block = quantized[start:start + SCAN_BLOCK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    return scores
+
+
+def binarize(vectors) -> np.ndarray:
+    """One sign bit per dimension, packed 8 to a byte"""
+    return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+
+# Set bits in every byte value, for Hamming distances without np.bitwise_count
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def hamming_scores(bits: np.ndarray, query_bits: np.ndarray) -> np.ndarray:
+    """Negated Hamming distances, so that higher is more similar"""
+    scores = np.empty(len(bits), dtype=np.int32)
+    for start in range(0, len(bits), SCAN_BLOCK_ROWS):
+        block = bits[start:start + SCAN_BLOCK_ROWS]
+        scores[start:start + len(block)] = -_POPCOUNT[block ^ query_bits].sum(axis=1, dtype=np.int32)
+    return scores
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+def rescore(candidates: np.ndarray, vectors, query, k: int) -> tuple:
+    """Re-rank candidate rows by their full-precision scores"""
+    candidates = np.sort(candidates)
+    if not len(candidates):
+        return candidates, np.empty(0, dtype=np.float32)
+    exact = np.asarray(vectors[candidates], dtype=np.float32) @ np.asarray(query, dtype=np.float32)
+    order = top_k(exact, k)
+    return candidates[order], exact[order]
+
+
+def qdrant_quantization(mode: str):
+    """Qdrant quantization config for "scalar"/"int8", "binary" or "none" """
+    if mode in ("scalar", "int8"):
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=INT8_QUANTILE, always_ram=True)
+        )
+    if mode == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def qdrant_search_params(mode: str, oversampling: float = 2.0):
+    """Search the quantized vectors, then rescore an oversampled shortlist at full precision"""
+    if qdrant_quantization(mode) is None:
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(rescore=True, oversampling=oversampling)
+    )
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from qdrant_client import models
+
+# Shared pool so the dense and keyword searches of a question run side by side
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+# Standard RRF damping constant; higher values flatten the rank weights
+RRF_K = 60
+
+
+def document_key(document) -> str:
+    """Identify the same chunk across retrievers"""
+    return str(document.metadata.get("_id", document.page_content))
+
+
+def reciprocal_rank_fusion(result_lists, k: int = 4, rrf_k: int = RRF_K) -> list:
+    """Merge ranked Document lists, scoring each by the sum of 1 / (rrf_k + rank)"""
+    scores = {}
+    documents = {}
+    for results in result_lists:
+        for rank, document in enumerate(results, start=1):
+            key = document_key(document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, document)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:k]]
+
+
+def hybrid_search(vector_search, keyword_search, k: int = 4) -> list:
+    """Run the dense and BM25 searches concurrently and fuse their rankings
+
+    Both arguments are zero-argument callables returning ranked Documents.
+    """
+    vector_future = _search_pool.submit(vector_search)
+    keyword_future = _search_pool.submit(keyword_search)
+    return reciprocal_rank_fusion([vector_future.result(), keyword_future.result()], k=k)
+
+
+def _allowed(value) -> list:
+    return list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+
+def matches_filter(metadata: dict, conditions) -> bool:
+    """Check chunk metadata against {field: value or list of accepted values}"""
+    return not conditions or all(
+        metadata.get(field) in _allowed(value) for field, value in conditions.items()
+    )
+
+
+def qdrant_filter(conditions, metadata_payload_key: str = "metadata"):
+    """The same conditions as a Qdrant payload filter"""
+    if not conditions:
+        return None
+    must = []
+    for field, value in conditions.items():
+        values = _allowed(value)
+        match = models.MatchValue(value=values[0]) if len(values) == 1 else models.MatchAny(any=values)
+        must.append(models.FieldCondition(key=f"{metadata_payload_key}.{field}", match=match))
+    return models.Filter(must=must)
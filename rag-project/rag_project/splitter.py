@@ -0,0 +1,87 @@
+import re
+from bisect import bisect_left, bisect_right
+
+import tiktoken
+from langchain_core.documents import Document
+
+# A sentence ends at ., ! or ? before whitespace, or at a blank line
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s)|\n\s*\n")
+
+
+class TokenChunker:
+    """Split text on token offsets, snapping chunk ends to sentence boundaries
+
+    Chunks are placed on the page's encoding, then each is encoded on its
+    own: token_count is exact for the embedding model's tokenizer and never
+    more than chunk_tokens, so chunking matches what embedding costs.
+    """
+
+    def __init__(
+        self,
+        chunk_tokens: int = 256,
+        overlap_tokens: int = 32,
+        encoding_name: str = "cl100k_base",
+        snap_window: float = 0.25,
+    ):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        # How far back from the hard limit a chunk may end to hit a sentence end
+        self.snap_tokens = int(chunk_tokens * snap_window)
+
+    def split_text_with_offsets(self, text: str) -> list:
+        """Return (start_index, chunk_text, token_count) for each chunk"""
+        tokens = self.encoding.encode_ordinary(text)
+        if not tokens:
+            return []
+        text, offsets = self.encoding.decode_with_offsets(tokens)
+        total = len(tokens)
+
+        # Token indices at which a new sentence starts
+        boundaries = [bisect_left(offsets, match.end()) for match in SENTENCE_END.finditer(text)]
+
+        spans = []
+        start = 0
+        while start < total:
+            end = min(start + self.chunk_tokens, total)
+            if end < total:
+                lowest = end - self.snap_tokens
+                i = bisect_right(boundaries, end) - 1
+                if i >= 0 and boundaries[i] > start and boundaries[i] >= lowest:
+                    end = boundaries[i]
+            start_char = offsets[start]
+            end_char = offsets[end] if end < total else len(text)
+            chunk_text = text[start_char:end_char]
+            if chunk_text.strip():
+                spans.append((start_char, chunk_text))
+            if end >= total:
+                break
+            start = max(end - self.overlap_tokens, start + 1)
+        # Tokens can merge differently at a chunk's edges than inside the page,
+        # so count each chunk's own encoding (one multi-threaded batch per page)
+        encoded = self.encoding.encode_ordinary_batch([chunk_text for _, chunk_text in spans])
+        chunks = []
+        for (start_char, chunk_text), chunk_tokens in zip(spans, encoded):
+            # and cut back the end of the rare chunk that grew past the limit
+            while len(chunk_tokens) > self.chunk_tokens:
+                _, chunk_offsets = self.encoding.decode_with_offsets(chunk_tokens)
+                chunk_text = chunk_text[:chunk_offsets[self.chunk_tokens]]
+                chunk_tokens = self.encoding.encode_ordinary(chunk_text)
+            chunks.append((start_char, chunk_text, len(chunk_tokens)))
+        return chunks
+
+    def split_text(self, text: str) -> list:
+        return [chunk_text for _, chunk_text, _ in self.split_text_with_offsets(text)]
+
+    def split_documents(self, documents) -> list:
+        """Split Documents, recording start_index and token_count per chunk"""
+        chunks = []
+        for document in documents:
+            for start_char, chunk_text, token_count in self.split_text_with_offsets(document.page_content):
+                chunks.append(Document(
+                    page_content=chunk_text,
+                    metadata={**document.metadata, "start_index": start_char, "token_count": token_count},
+                ))
+        return chunks
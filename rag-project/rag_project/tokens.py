@@ -0,0 +1,48 @@
+from functools import lru_cache
+
+import tiktoken
+
+# Chat-completions framing, as billed: every message is wrapped in
+# <|start|>{role/name}\n{content}<|end|>\n and every reply is primed with
+# <|start|>assistant<|message|>
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+TOKENS_PER_REPLY = 3
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-4o-mini"):
+    """Load the encoding for a model once per process"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Models newer than the installed tiktoken use the o200k vocabulary
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Count tokens in text, treating special-token markers as plain text"""
+    return len(get_encoding(model).encode_ordinary(text))
+
+
+def count_tokens_batch(texts, model: str = "gpt-4o-mini", num_threads: int = 8) -> list:
+    """Count tokens for many texts with tiktoken's multi-threaded batch encoder"""
+    encoded = get_encoding(model).encode_ordinary_batch(list(texts), num_threads=num_threads)
+    return [len(tokens) for tokens in encoded]
+
+
+def count_message_tokens(messages, model: str = "gpt-4o-mini") -> int:
+    """Count prompt tokens for a chat-completions request, including framing"""
+    values = []
+    names = 0
+    for message in messages:
+        for key, value in message.items():
+            if isinstance(value, str):
+                values.append(value)
+                names += key == "name"
+    return (
+        sum(count_tokens_batch(values, model))
+        + TOKENS_PER_MESSAGE * len(messages)
+        + TOKENS_PER_NAME * names
+        + TOKENS_PER_REPLY
+    )
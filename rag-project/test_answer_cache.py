@@ -0,0 +1,58 @@
+import numpy as np
+
+from rag_project import answer_cache
+from rag_project.answer_cache import SemanticAnswerCache
+
+QUESTION = np.array([1.0, 0.0, 0.0])
+PARAPHRASE = np.array([0.99, 0.05, 0.0])
+OTHER = np.array([0.0, 1.0, 0.0])
+
+
+def test_similar_question_hits_and_different_one_misses():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("manual", QUESTION, "How do I install?", "Run npm install")
+
+    assert cache.lookup("manual", PARAPHRASE) == "Run npm install"
+    assert cache.lookup("manual", OTHER) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_answers_are_kept_per_collection_and_scope():
+    cache = SemanticAnswerCache()
+    cache.store("manual", QUESTION, "q", "answer for a.pdf", scope="a.pdf")
+
+    assert cache.lookup("manual", QUESTION, scope="a.pdf") == "answer for a.pdf"
+    assert cache.lookup("manual", QUESTION, scope="b.pdf") is None
+    assert cache.lookup("other", QUESTION, scope="a.pdf") is None
+
+
+def test_invalidate_drops_every_scope_and_multi_collection_answers():
+    cache = SemanticAnswerCache()
+    cache.store("manual", QUESTION, "q", "one", scope="a.pdf")
+    cache.store("manual", QUESTION, "q", "two", scope="b.pdf")
+    cache.store("guide,manual", QUESTION, "q", "both")
+    cache.store("guide", QUESTION, "q", "guide only")
+
+    cache.invalidate("manual")
+    assert cache.lookup("manual", QUESTION, scope="a.pdf") is None
+    assert cache.lookup("manual", QUESTION, scope="b.pdf") is None
+    assert cache.lookup("guide,manual", QUESTION) is None
+    assert cache.lookup("guide", QUESTION) == "guide only"
+
+    # Answers stored after the invalidation are served again
+    cache.store("manual", QUESTION, "q", "fresh", scope="a.pdf")
+    assert cache.lookup("manual", QUESTION, scope="a.pdf") == "fresh"
+
+
+def test_expired_and_evicted_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(ttl=60, max_entries=1)
+    cache.store("manual", QUESTION, "q1", "old")
+    now[0] += 61
+    assert cache.lookup("manual", QUESTION) is None
+
+    cache.store("manual", QUESTION, "q1", "first")
+    cache.store("manual", OTHER, "q2", "second")
+    assert cache.lookup("manual", QUESTION) is None
+    assert cache.lookup("manual", OTHER) == "second"
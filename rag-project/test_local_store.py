@@ -0,0 +1,136 @@
+import hashlib
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from rag_project import local_store
+from rag_project.local_store import LocalVectorStore
+
+
+class HashEmbeddings(Embeddings):
+    """Same text, same unit vector, without calling an API"""
+
+    def __init__(self, dim: int = 16):
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+TEXTS = [f"chunk number {i}" for i in range(20)]
+
+
+def build(path, texts=TEXTS):
+    metadatas = [{"page": i, "owner": "alice" if i % 2 else "bob"} for i in range(len(texts))]
+    ids = [f"id-{i}" for i in range(len(texts))]
+    return LocalVectorStore.from_texts(
+        texts, HashEmbeddings(), metadatas=metadatas, ids=ids, collection_name="docs", path=path
+    )
+
+
+def contents(results):
+    return [document.page_content for document in results]
+
+
+def test_from_existing_collection_reads_back_what_was_written(tmp_path):
+    store = build(tmp_path)
+    reopened = LocalVectorStore.from_existing_collection("docs", HashEmbeddings(), path=tmp_path)
+
+    assert LocalVectorStore.collection_exists("docs", tmp_path)
+    assert len(reopened) == len(TEXTS)
+    assert contents(reopened.similarity_search(TEXTS[7], k=3)) == contents(store.similarity_search(TEXTS[7], k=3))
+    best = reopened.similarity_search(TEXTS[7], k=1)[0]
+    assert best.page_content == TEXTS[7]
+    assert best.metadata["_id"] == "id-7" and best.metadata["page"] == 7
+
+
+def test_missing_collection_is_an_error(tmp_path):
+    assert not LocalVectorStore.collection_exists("docs", tmp_path)
+    with pytest.raises(ValueError):
+        LocalVectorStore.from_existing_collection("docs", path=tmp_path)
+
+
+def test_adding_an_existing_id_overwrites_it(tmp_path):
+    store = build(tmp_path)
+    store.add_texts(["replacement text"], metadatas=[{"page": 3}], ids=["id-3"])
+
+    for current in (store, LocalVectorStore.from_existing_collection("docs", HashEmbeddings(), path=tmp_path)):
+        assert len(current) == len(TEXTS)
+        results = current.similarity_search("replacement text", k=len(TEXTS))
+        assert [document.metadata["_id"] for document in results].count("id-3") == 1
+        assert results[0].page_content == "replacement text"
+        assert TEXTS[3] not in contents(results)
+
+
+def test_delete_removes_points_for_good(tmp_path):
+    store = build(tmp_path)
+    store.delete(["id-5", "id-6", "no-such-id"])
+
+    for current in (store, LocalVectorStore.from_existing_collection("docs", HashEmbeddings(), path=tmp_path)):
+        assert len(current) == len(TEXTS) - 2
+        found = contents(current.similarity_search(TEXTS[5], k=len(TEXTS)))
+        assert TEXTS[5] not in found and TEXTS[6] not in found
+        assert len(found) == len(TEXTS) - 2
+
+
+def test_metadata_filters(tmp_path):
+    store = build(tmp_path)
+
+    alice = store.similarity_search(TEXTS[4], k=len(TEXTS), filter={"owner": "alice"})
+    assert {document.metadata["page"] for document in alice} == set(range(1, len(TEXTS), 2))
+
+    pages = store.similarity_search(TEXTS[4], k=len(TEXTS), filter={"owner": "bob", "page": [2, 3, 4]})
+    assert sorted(document.metadata["page"] for document in pages) == [2, 4]
+
+    assert store.similarity_search(TEXTS[4], filter={"owner": "carol"}) == []
+
+
+@pytest.mark.parametrize("size, uses_hnsw", [(len(TEXTS) - 1, False), (len(TEXTS), True)])
+def test_hnsw_takes_over_at_the_threshold_with_the_same_results(tmp_path, size, uses_hnsw):
+    pytest.importorskip("hnswlib")
+    exact = build(tmp_path / "exact", TEXTS[:size])
+    exact.hnsw_threshold = 10**9
+    store = build(tmp_path / "hnsw", TEXTS[:size])
+    store.hnsw_threshold = len(TEXTS)
+
+    for query in TEXTS[:5]:
+        assert contents(store.similarity_search(query, k=5)) == contents(exact.similarity_search(query, k=5))
+    assert (store._hnsw is not None) == uses_hnsw
+
+
+def test_hnsw_search_honours_deletes_and_filters(tmp_path):
+    pytest.importorskip("hnswlib")
+    store = build(tmp_path)
+    store.hnsw_threshold = 1
+    store.similarity_search(TEXTS[0])
+    store.delete(["id-1"])
+
+    assert store._hnsw is not None
+    assert TEXTS[1] not in contents(store.similarity_search(TEXTS[1], k=len(TEXTS)))
+    alice = store.similarity_search(TEXTS[1], k=3, filter={"owner": "alice"})
+    assert len(alice) == 3 and all(document.metadata["owner"] == "alice" for document in alice)
+
+
+def test_meta_is_written_after_the_data(tmp_path, monkeypatch):
+    # A first write that dies before meta.json leaves no collection behind
+    monkeypatch.setattr(local_store, "_write_meta", lambda directory, meta: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        build(tmp_path)
+    assert (tmp_path / "docs" / "records.jsonl").exists()
+    assert not LocalVectorStore.collection_exists("docs", tmp_path)
+
+    # and the next attempt starts the files afresh
+    monkeypatch.undo()
+    build(tmp_path, TEXTS[:3])
+    reopened = LocalVectorStore.from_existing_collection("docs", HashEmbeddings(), path=tmp_path)
+    assert len(reopened) == 3 and len(reopened._records) == 3
+    assert not list((tmp_path / "docs").glob("*.tmp"))
@@ -0,0 +1,97 @@
+import hashlib
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from rag_project import ingest
+from rag_project.ingest import IngestionPipeline
+from rag_project.local_store import LocalVectorStore
+from rag_project.manifest import IndexManifest, chunk_id, file_digest
+
+
+class RecordingEmbeddings:
+    """Deterministic vectors; remembers every text it was asked to embed"""
+
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest(), dtype=np.uint8) / 255.0
+                for text in texts]
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """Index a document version the way the app does: skip known chunks, delete stale ones"""
+    monkeypatch.setattr(ingest.tiktoken, "get_encoding", lambda name: None)
+    store = LocalVectorStore(tmp_path / "vectors", "docs")
+    embeddings = RecordingEmbeddings()
+
+    def run(pages: list) -> dict:
+        data = "\f".join(pages).encode("utf-8")
+        manifest = IndexManifest("docs", tmp_path / "manifests")
+        known_ids = manifest.chunk_ids("manual.pdf")
+        if manifest.is_current("manual.pdf", file_digest(data)):
+            return {"unchanged": True}
+        embedded_before = len(embeddings.texts)
+        stats = IngestionPipeline(embeddings, store.add_vectors, max_concurrency=2).run(
+            [Document(page_content=text, metadata={"page": page, "token_count": 1}) for page, text in enumerate(pages)],
+            split=lambda page: [page],
+            chunk_id=lambda chunk: chunk_id("manual.pdf", chunk.metadata["page"], chunk.page_content),
+            skip=known_ids.__contains__,
+        )
+        stale_ids = known_ids - set(stats.ids)
+        store.delete(list(stale_ids))
+        manifest.record("manual.pdf", file_digest(data), stats.ids, filename="manual.pdf", owner="alice")
+        manifest.save()
+        return {"embedded": embeddings.texts[embedded_before:], "skipped": stats.skipped, "removed": len(stale_ids)}
+
+    run.store = store
+    return run
+
+
+def test_chunk_ids_are_stable_and_distinct():
+    assert chunk_id("a.pdf", 1, "text") == chunk_id("a.pdf", 1, "text")
+    assert len({chunk_id("a.pdf", 1, "text"), chunk_id("b.pdf", 1, "text"),
+                chunk_id("a.pdf", 2, "text"), chunk_id("a.pdf", 1, "other")}) == 4
+
+
+def test_manifest_round_trips_through_disk(tmp_path):
+    manifest = IndexManifest("docs", tmp_path)
+    manifest.record("a.pdf", "digest-1", {"id-2", "id-1"}, filename="a.pdf", owner="alice")
+    manifest.record("b.pdf", "digest-2", ["id-3"], filename="b.pdf", owner="bob")
+    manifest.save()
+
+    reloaded = IndexManifest("docs", tmp_path)
+    assert reloaded.is_current("a.pdf", "digest-1")
+    assert not reloaded.is_current("a.pdf", "digest-2")
+    assert not reloaded.is_current("c.pdf", "digest-1")
+    assert reloaded.chunk_ids("a.pdf") == {"id-1", "id-2"}
+    assert reloaded.entries(owner="bob") == {"b.pdf": {"filename": "b.pdf", "owner": "bob", "digest": "digest-2"}}
+
+    reloaded.reset()
+    assert IndexManifest("docs", tmp_path).documents == {}
+
+
+def test_corrupt_manifest_starts_empty(tmp_path):
+    (tmp_path / "docs.json").write_text("{not json")
+    assert IndexManifest("docs", tmp_path).documents == {}
+
+
+def test_unchanged_file_is_skipped(index):
+    pages = ["intro", "install", "usage"]
+    assert len(index(pages)["embedded"]) == 3
+    assert index(pages) == {"unchanged": True}
+
+
+def test_new_version_embeds_only_changed_chunks_and_drops_stale_ones(index):
+    index(["intro", "install", "usage", "faq"])
+    result = index(["intro", "install v2", "usage"])
+
+    assert result == {"embedded": ["install v2"], "skipped": 2, "removed": 2}
+    assert len(index.store) == 3
+    assert sorted(record["page_content"] for record in index.store._records if record) == [
+        "install v2", "intro", "usage"
+    ]
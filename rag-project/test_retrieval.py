@@ -0,0 +1,72 @@
+from langchain_core.documents import Document
+
+from rag_project.bm25 import BM25Index, tokenize
+from rag_project.retrieval import hybrid_search, reciprocal_rank_fusion
+
+CHUNKS = {
+    "fs": "Use fs.readFile to read a file asynchronously",
+    "env": "process.env.NODE_ENV selects the environment",
+    "http": "ERR_HTTP_HEADERS_SENT means headers were already sent",
+    "stream": "Streams read a file in chunks instead of all at once",
+}
+
+
+def chunk(point_id, **metadata):
+    return Document(page_content=CHUNKS.get(point_id, point_id), metadata={"_id": point_id, **metadata})
+
+
+def build(tmp_path):
+    index = BM25Index("docs", tmp_path)
+    index.add(list(CHUNKS), [chunk(point_id, owner="alice" if point_id in ("fs", "env") else "bob")
+                             for point_id in CHUNKS])
+    return index
+
+
+def ids(results):
+    return [document.metadata["_id"] for document, *_ in results]
+
+
+def test_dotted_identifiers_stay_whole_and_split():
+    assert tokenize("process.env.NODE_ENV 18.2") == [
+        "process.env.node_env", "process", "env", "node_env", "18.2"
+    ]
+
+
+def test_exact_identifier_ranks_first(tmp_path):
+    index = build(tmp_path)
+    assert ids(index.search("ERR_HTTP_HEADERS_SENT", k=2)) == ["http"]
+    assert ids(index.search("fs.readFile", k=1)) == ["fs"]
+
+
+def test_filter_and_replace(tmp_path):
+    index = build(tmp_path)
+    assert ids(index.search("read a file", k=4, filter={"owner": "bob"})) == ["stream"]
+
+    index.add(["fs"], [Document(page_content="fs.writeFile writes a file", metadata={})])
+    assert "readfile" not in index.postings and len(index.documents) == len(CHUNKS)
+    assert ids(index.search("writeFile", k=4)) == ["fs"]
+
+
+def test_saved_index_reloads(tmp_path):
+    index = build(tmp_path)
+    index.remove(["env"])
+    index.save()
+
+    reloaded = BM25Index("docs", tmp_path)
+    assert reloaded.total_length == index.total_length
+    assert ids(reloaded.search("read a file", k=4)) == ids(index.search("read a file", k=4))
+    assert reloaded.search("NODE_ENV") == []
+
+
+def test_fusion_rewards_agreement_and_deduplicates():
+    dense = [chunk("a"), chunk("b"), chunk("c")]
+    keyword = [chunk("c"), chunk("d"), chunk("b")]
+
+    fused = reciprocal_rank_fusion([dense, keyword], k=4)
+    assert [document.metadata["_id"] for document in fused] == ["c", "b", "a", "d"]
+    assert len(reciprocal_rank_fusion([dense, keyword], k=10)) == 4
+
+
+def test_hybrid_search_fuses_both_retrievers():
+    fused = hybrid_search(lambda: [chunk("a"), chunk("b")], lambda: [chunk("b"), chunk("c")], k=2)
+    assert [document.metadata["_id"] for document in fused] == ["b", "a"]
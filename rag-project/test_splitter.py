@@ -0,0 +1,54 @@
+import re
+
+from rag_project import splitter
+from rag_project.splitter import TokenChunker
+
+
+class EdgeEncoding:
+    """Words and whitespace runs are tokens, but trailing whitespace is one token per character
+
+    Like tiktoken, a chunk cut out of a page can then encode to more tokens
+    on its own than it took up inside the page.
+    """
+
+    def __init__(self):
+        self.pieces = []
+        self.ids = {}
+
+    def encode_ordinary(self, text):
+        pieces = re.findall(r"\S+|\s+", text)
+        if pieces and pieces[-1].isspace():
+            pieces[-1:] = list(pieces[-1])
+        for piece in pieces:
+            if piece not in self.ids:
+                self.ids[piece] = len(self.pieces)
+                self.pieces.append(piece)
+        return [self.ids[piece] for piece in pieces]
+
+    def encode_ordinary_batch(self, texts, num_threads=8):
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode_with_offsets(self, tokens):
+        offsets, position = [], 0
+        for token in tokens:
+            offsets.append(position)
+            position += len(self.pieces[token])
+        return "".join(self.pieces[token] for token in tokens), offsets
+
+
+def test_chunks_never_exceed_the_token_limit(monkeypatch):
+    encoding = EdgeEncoding()
+    monkeypatch.setattr(splitter.tiktoken, "get_encoding", lambda name: encoding)
+    chunker = TokenChunker(chunk_tokens=8, overlap_tokens=2, snap_window=0)
+    text = "".join(f"word{i}" + " " * (1 + i % 5) for i in range(60))
+
+    chunks = chunker.split_text_with_offsets(text)
+    assert chunks
+    for start, chunk_text, token_count in chunks:
+        assert token_count == len(encoding.encode_ordinary(chunk_text)) <= 8
+        assert text[start:start + len(chunk_text)] == chunk_text
+    # Consecutive chunks still overlap, so trimming loses no text
+    covered = set()
+    for start, chunk_text, _ in chunks:
+        covered.update(range(start, start + len(chunk_text.rstrip())))
+    assert all(i in covered for i, char in enumerate(text.rstrip()) if not char.isspace())